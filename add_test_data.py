@@ -57,7 +57,8 @@ test_tasks = [
 ]
 
 print(f"Adding {len(test_tasks)} test tasks...")
-for description, priority in test_tasks:
-    manager.add_task(description, priority)
-    
-print(f"✅ Done! Added {len(test_tasks)} tasks to the database.")
+# One transaction for all tasks instead of one commit per task
+added = manager.add_tasks(test_tasks)
+manager.close()
+
+print(f"✅ Done! Added {len(added)} tasks to the database.")
@@ -0,0 +1,269 @@
+# async_task_manager.py
+# asyncio front-end for TaskManager
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from task_manager import ARCHIVE_AFTER_DAYS, TaskManager
+
+
+class AsyncTaskManager:
+    """Awaitable TaskManager that keeps SQLite work off the event loop
+
+    All database work runs on one dedicated thread, which owns its own
+    TaskManager (and so its own connection). Requests that arrive in the
+    same event-loop tick are sent to that thread together and run in one
+    transaction. Each request gets its own savepoint, so one failing
+    request doesn't undo the others.
+
+        async with AsyncTaskManager('tasks.db') as manager:
+            task = await manager.add_task("Buy groceries", "high")
+    """
+
+    def __init__(self, db_name='tasks.db', load=False, **options):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='task-db')
+        self._options = dict(options, db_name=db_name, load=load)
+        self._manager = None            # only touched on the executor thread
+        self._loop = None
+        self._requests = []             # (method name, args, kwargs, future) waiting for this tick
+        self._drain_scheduled = False
+        self._closed = False
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
+
+    async def open(self):
+        """Open the database (done automatically by the first request)"""
+        await self._call('open')
+
+    async def close(self):
+        """Finish queued requests, close the database and stop the thread"""
+        if self._closed:
+            return
+        self._closed = True
+        # Send anything still waiting for this tick first; the executor has a
+        # single thread, so those jobs finish before the close job runs
+        if self._requests:
+            self._drain()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_manager)
+        self._executor.shutdown(wait=True)
+
+    # ----- Request batching -----
+
+    async def _call(self, method, *args, **kwargs):
+        """Queue a TaskManager call for the database thread and wait for its result"""
+        if self._closed:
+            raise RuntimeError("AsyncTaskManager is closed")
+        loop = asyncio.get_running_loop()
+        if self._loop is None:
+            self._loop = loop
+        future = loop.create_future()
+        self._requests.append((method, args, kwargs, future))
+        if not self._drain_scheduled:
+            # Everything queued before the loop gets back to us goes in one job
+            self._drain_scheduled = True
+            loop.call_soon(self._drain)
+        return await future
+
+    def _drain(self):
+        """Send this tick's requests to the database thread as one job"""
+        self._drain_scheduled = False
+        requests, self._requests = self._requests, []
+        if not requests:
+            return
+        job = self._loop.run_in_executor(self._executor, self._run_requests,
+                                         [(method, args, kwargs) for method, args, kwargs, _ in requests])
+        job.add_done_callback(partial(self._deliver, [future for *_, future in requests]))
+
+    def _deliver(self, futures, job):
+        """Hand each request its result (or exception) back on the event loop"""
+        if job.cancelled() or job.exception() is not None:
+            error = job.exception() if not job.cancelled() else asyncio.CancelledError()
+            for future in futures:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, (ok, value) in zip(futures, job.result()):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    # ----- Database thread -----
+
+    def _run_requests(self, requests):
+        """Run a list of requests on the database thread; return (ok, value) pairs"""
+        if self._manager is None:
+            self._manager = TaskManager(**self._options)
+        if len(requests) == 1:
+            return [self._run_one(*requests[0])]
+
+        outcomes = []
+        with self._manager.batch():
+            for request in requests:
+                outcomes.append(self._run_one(*request, savepoint=True))
+        return outcomes
+
+    def _run_one(self, method, args, kwargs, savepoint=False):
+        """Run one request, returning (True, result) or (False, exception)"""
+        # A few calls need adapting for the caller (see the _do_ methods below)
+        handler = getattr(self, '_do_' + method, None) or getattr(self._manager, method)
+        try:
+            if savepoint:
+                with self._manager.batch():
+                    return True, handler(*args, **kwargs)
+            return True, handler(*args, **kwargs)
+        except Exception as error:
+            return False, error
+
+    def _close_manager(self):
+        if self._manager is not None:
+            self._manager.close()
+            self._manager = None
+
+    def _do_open(self):
+        # Opening happens in _run_requests; nothing else to do
+        return None
+
+    def _do_load_tasks(self):
+        self._manager.load_tasks()
+        return list(self._manager.tasks)
+
+    def _do_get_all_tasks(self):
+        # Copy, so the caller's list doesn't change under it
+        return list(self._manager.get_all_tasks())
+
+    def _do_list_tasks(self, **filters):
+        return list(self._manager.iter_tasks(**filters))
+
+    # ----- Awaitable TaskManager API -----
+
+    async def load_tasks(self):
+        """Load all tasks into memory and return them"""
+        return await self._call('load_tasks')
+
+    async def get_all_tasks(self):
+        """Return all tasks"""
+        return await self._call('get_all_tasks')
+
+    async def list_tasks(self, completed=None, priority=None, order_by='id'):
+        """Return tasks matching the filters, read straight from the database"""
+        return await self._call('list_tasks', completed=completed, priority=priority, order_by=order_by)
+
+    async def add_task(self, description, priority='medium'):
+        """Add a new task"""
+        return await self._call('add_task', description, priority)
+
+    async def add_tasks(self, task_data):
+        """Add many (description, priority) tasks in one transaction"""
+        return await self._call('add_tasks', list(task_data))
+
+    async def get_task(self, index):
+        """Get a task by index (0-based)"""
+        return await self._call('get_task', index)
+
+    async def get_task_by_id(self, task_id):
+        """Get a task by its database id"""
+        return await self._call('get_task_by_id', task_id)
+
+    async def delete_task(self, index):
+        """Delete a task by index"""
+        return await self._call('delete_task', index)
+
+    async def delete_task_by_id(self, task_id):
+        """Delete a task by its database id"""
+        return await self._call('delete_task_by_id', task_id)
+
+    async def mark_task_complete(self, index):
+        """Mark a task as complete"""
+        return await self._call('mark_task_complete', index)
+
+    async def mark_task_complete_by_id(self, task_id):
+        """Mark a task as complete by its database id"""
+        return await self._call('mark_task_complete_by_id', task_id)
+
+    async def mark_task_incomplete_by_id(self, task_id):
+        """Mark a task as incomplete by its database id"""
+        return await self._call('mark_task_incomplete_by_id', task_id)
+
+    async def set_task_priority(self, index, priority):
+        """Set priority for a task"""
+        return await self._call('set_task_priority', index, priority)
+
+    async def set_task_priority_by_id(self, task_id, priority):
+        """Set priority for a task by its database id"""
+        return await self._call('set_task_priority_by_id', task_id, priority)
+
+    async def complete_where(self, ids=None, priority=None, older_than=None):
+        """Mark every matching incomplete task complete in one statement"""
+        ids = list(ids) if ids is not None else None
+        return await self._call('complete_where', ids=ids, priority=priority, older_than=older_than)
+
+    async def set_priority_where(self, new_priority, ids=None, priority=None, completed=None, older_than=None):
+        """Give every matching task new_priority in one statement"""
+        ids = list(ids) if ids is not None else None
+        return await self._call('set_priority_where', new_priority, ids=ids, priority=priority,
+                                completed=completed, older_than=older_than)
+
+    async def delete_where(self, ids=None, priority=None, completed=None, older_than=None):
+        """Delete every matching task in one statement"""
+        ids = list(ids) if ids is not None else None
+        return await self._call('delete_where', ids=ids, priority=priority, completed=completed,
+                                older_than=older_than)
+
+    async def missing_ids(self, ids):
+        """Return the ids that have no task"""
+        return await self._call('missing_ids', list(ids))
+
+    async def next_tasks(self, k=5):
+        """Return the k incomplete tasks to do next, most urgent first"""
+        return await self._call('next_tasks', k)
+
+    async def archive_completed(self, older_than=ARCHIVE_AFTER_DAYS):
+        """Move tasks completed more than `older_than` days ago to the archive"""
+        return await self._call('archive_completed', older_than)
+
+    async def restore_archived(self, ids):
+        """Move archived tasks back into the task list"""
+        return await self._call('restore_archived', list(ids))
+
+    async def get_archived_tasks(self, query=None, limit=None):
+        """Return archived tasks, most recently completed first"""
+        return await self._call('get_archived_tasks', query, limit=limit)
+
+    async def get_archived_count(self):
+        """Return the number of archived tasks"""
+        return await self._call('get_archived_count')
+
+    async def get_task_count(self):
+        """Return the total number of tasks"""
+        return await self._call('get_task_count')
+
+    async def get_incomplete_count(self):
+        """Return number of incomplete tasks"""
+        return await self._call('get_incomplete_count')
+
+    async def get_completed_count(self):
+        """Return number of completed tasks"""
+        return await self._call('get_completed_count')
+
+    async def get_priority_counts(self, completed=False):
+        """Return task counts per priority"""
+        return await self._call('get_priority_counts', completed)
+
+    async def get_tasks_by_priority(self):
+        """Return tasks grouped by priority"""
+        return await self._call('get_tasks_by_priority')
+
+    async def search(self, query, limit=20):
+        """Return tasks matching a search query, best matches first"""
+        return await self._call('search', query, limit)
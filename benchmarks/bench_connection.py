@@ -0,0 +1,66 @@
+# bench_connection.py - Per-operation latency: connect-per-op vs persistent connection
+#
+# Run: python3 benchmarks/bench_connection.py [number_of_operations]
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_manager import TaskManager
+
+
+def connect_per_op(db_name, operations):
+    """The old way: open, execute, commit and close for every operation"""
+    conn = sqlite3.connect(db_name)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            description TEXT NOT NULL,
+            completed INTEGER DEFAULT 0,
+            priority TEXT DEFAULT 'medium',
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+    start = time.perf_counter()
+    for i in range(operations):
+        conn = sqlite3.connect(db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO tasks (description, completed, priority, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (f"Task {i}", 0, 'medium', '2025-01-01T00:00:00'))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def persistent_connection(db_name, operations):
+    """The new way: one TaskManager connection for all operations"""
+    with TaskManager(db_name) as manager:
+        start = time.perf_counter()
+        for i in range(operations):
+            manager.add_task(f"Task {i}", 'medium')
+        return time.perf_counter() - start
+
+
+def main():
+    operations = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = connect_per_op(os.path.join(tmp, 'before.db'), operations)
+        after = persistent_connection(os.path.join(tmp, 'after.db'), operations)
+
+    print(f"{operations} add operations")
+    print(f"connect-per-op:        {before:.2f}s  ({before / operations * 1e6:.0f} µs/op)")
+    print(f"persistent connection: {after:.2f}s  ({after / operations * 1e6:.0f} µs/op)")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# bench_profiles.py - Write and read throughput for each SQLite profile
+#
+# Run: python3 benchmarks/bench_profiles.py [single_writes] [bulk_rows]
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_manager import DB_PROFILES, TaskManager
+
+
+def bench_profile(path, profile, single_writes, bulk_rows):
+    """Return operations per second for a few write and read patterns"""
+    results = {}
+    priorities = ['low', 'medium', 'high']
+
+    with TaskManager(path, load=False, profile=profile) as manager:
+        # One commit per task: what the menu and CLI do
+        start = time.perf_counter()
+        for i in range(single_writes):
+            manager.add_task(f"Single task {i}", priorities[i % 3])
+        results['add_task/s'] = single_writes / (time.perf_counter() - start)
+
+        # One transaction for many tasks
+        start = time.perf_counter()
+        manager.add_tasks((f"Bulk task {i}", priorities[i % 3]) for i in range(bulk_rows))
+        results['add_tasks rows/s'] = bulk_rows / (time.perf_counter() - start)
+
+        # Flip a task per commit
+        start = time.perf_counter()
+        for task_id in range(1, single_writes + 1):
+            manager.set_task_priority_by_id(task_id, 'high')
+        results['set_priority/s'] = single_writes / (time.perf_counter() - start)
+
+    with TaskManager(path, load=False, profile=profile) as manager:
+        total = single_writes + bulk_rows
+
+        # Full scan
+        start = time.perf_counter()
+        count = sum(1 for _ in manager.iter_tasks())
+        results['scan rows/s'] = count / (time.perf_counter() - start)
+
+        # Point lookups spread over the table
+        lookups = min(total, 20000)
+        step = max(1, total // lookups)
+        start = time.perf_counter()
+        for task_id in range(1, total + 1, step):
+            manager.get_task_by_id(task_id)
+        results['lookups/s'] = lookups / (time.perf_counter() - start)
+
+    return results
+
+
+def main():
+    single_writes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bulk_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    rows = []
+    for profile in DB_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows.append((profile, bench_profile(os.path.join(tmp, 'bench.db'), profile, single_writes, bulk_rows)))
+
+    columns = list(rows[0][1])
+    print(f"{'profile':<10}" + "".join(f"{name:>18}" for name in columns))
+    for profile, results in rows:
+        print(f"{profile:<10}" + "".join(f"{results[name]:>18,.0f}" for name in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# bench_render.py - "View Tasks" rendering: old per-group loops vs render_task_view()
+#
+# Run: python3 benchmarks/bench_render.py [sizes...]   (default: 1000 10000 100000)
+
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_manager import Task, render_task_view
+
+# The old renderer is quadratic, so don't run it on lists bigger than this
+OLD_RENDER_LIMIT = 20000
+
+
+def make_tasks(count):
+    """Build an in-memory list of random tasks"""
+    random.seed(count)
+    tasks = []
+    for i in range(count):
+        task = Task(f"Task number {i}", priority=random.choice(['low', 'medium', 'high']), task_id=i + 1)
+        task.completed = random.random() < 0.3
+        tasks.append(task)
+    return tasks
+
+
+def old_render(tasks, out):
+    """The old "View Tasks" branch: one loop per group and `in` checks on lists"""
+    high = [t for t in tasks if t.priority == 'high' and not t.completed]
+    medium = [t for t in tasks if t.priority == 'medium' and not t.completed]
+    low = [t for t in tasks if t.priority == 'low' and not t.completed]
+    completed = [t for t in tasks if t.completed]
+    print("\n" + "-"*40, file=out)
+    print("           YOUR TASKS", file=out)
+    print("-"*40, file=out)
+    for heading, group in [("\n🔴 HIGH PRIORITY:", high), ("\n🟡 MEDIUM PRIORITY:", medium),
+                           ("\n🟢 LOW PRIORITY:", low), ("\n✅ COMPLETED:", completed)]:
+        if group:
+            print(heading, file=out)
+            for i, task in enumerate(tasks, 1):
+                if task in group:
+                    print(f"  {i}. {task}", file=out)
+    print("-"*40, file=out)
+
+
+def new_render(tasks, out):
+    """The new renderer: one pass and one write"""
+    out.write(render_task_view(tasks))
+
+
+def time_render(render, tasks):
+    out = io.StringIO()
+    start = time.perf_counter()
+    render(tasks, out)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+
+    print(f"{'tasks':>8}  {'old':>10}  {'new':>10}")
+    for size in sizes:
+        tasks = make_tasks(size)
+        new = time_render(new_render, tasks)
+        if size <= OLD_RENDER_LIMIT:
+            old = f"{time_render(old_render, tasks):.4f}s"
+        else:
+            old = "skipped"
+        print(f"{size:>8}  {old:>10}  {new:>9.4f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# bench_startup.py - Cold start: import time and wall-clock time to the first menu prompt
+#
+# Run: python3 benchmarks/bench_startup.py [sizes...]   (default: 0 10000 1000000)
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO, 'task_manager.py')
+sys.path.insert(0, REPO)
+from task_manager import TaskManager
+
+PROMPT = "Enter your choice".encode('utf-8')
+RUNS = 5
+
+
+def make_database(path, size):
+    """Create a database with `size` tasks"""
+    priorities = ['low', 'medium', 'high']
+    with TaskManager(path, load=False) as manager:
+        manager.add_tasks((f"Task number {i}", priorities[i % 3]) for i in range(size))
+
+
+def import_time_us():
+    """Cumulative import time of task_manager, as reported by -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import task_manager'],
+                            cwd=REPO, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == 'task_manager':
+            return int(parts[1])
+    return None
+
+
+def time_to_prompt(workdir):
+    """Start the interactive program and time it until the menu prompt appears"""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SCRIPT], cwd=workdir,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    seen = b""
+    while PROMPT not in seen:
+        chunk = process.stdout.read1(4096)
+        if not chunk:
+            break
+        seen += chunk
+    elapsed = time.perf_counter() - start
+    # Choose "Exit"
+    process.communicate(b"7\n")
+    return elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [0, 10000, 1000000]
+
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            make_database(os.path.join(workdir, 'tasks.db'), size)
+            # Best of a few runs, so disk cache noise doesn't dominate
+            prompt = min(time_to_prompt(workdir) for _ in range(RUNS))
+        results.append({
+            'tasks': size,
+            'import_us': min(import_time_us() for _ in range(RUNS)),
+            'first_prompt_ms': round(prompt * 1000, 1),
+        })
+
+    print(f"{'tasks':>8}  {'import':>10}  {'first prompt':>12}")
+    for result in results:
+        print(f"{result['tasks']:>8}  {result['import_us']:>8}µs  {result['first_prompt_ms']:>10}ms")
+    print(json.dumps(results))
+
+
+if __name__ == "__main__":
+    main()
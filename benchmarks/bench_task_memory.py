@@ -0,0 +1,73 @@
+# bench_task_memory.py - Memory and hydration time: old Task class vs slotted Task.from_row
+#
+# Run: python3 benchmarks/bench_task_memory.py [number_of_tasks]
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_manager import Task
+
+
+class LegacyTask:
+    """The Task class before __slots__: __dict__ per instance and eager parsing"""
+
+    def __init__(self, description, completed=False, created_at=None, priority='medium', task_id=None):
+        self.id = task_id
+        self.description = description
+        self.completed = completed
+        if isinstance(priority, str) and priority.lower() in ['low', 'medium', 'high']:
+            self.priority = priority.lower()
+        else:
+            self.priority = 'medium'
+        if created_at:
+            self.created_at = datetime.fromisoformat(created_at)
+        else:
+            self.created_at = datetime.now()
+
+
+def make_rows(count):
+    """Rows shaped like SELECT id, description, completed, priority, created_at"""
+    priorities = ['low', 'medium', 'high']
+    return [(i, f"Task number {i}", i % 3 == 0, priorities[i % 3], f"2025-12-{1 + i % 28:02d}T10:00:00.{i % 1000000:06d}")
+            for i in range(count)]
+
+
+def legacy_hydrate(rows):
+    return [LegacyTask(description=row[1], completed=bool(row[2]), created_at=row[4], priority=row[3], task_id=row[0])
+            for row in rows]
+
+
+def slotted_hydrate(rows):
+    return [Task.from_row(*row) for row in rows]
+
+
+def measure(hydrate, rows):
+    """Return (seconds, bytes allocated) to build the task list"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tasks = hydrate(rows)
+    elapsed = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tasks
+    return elapsed, allocated
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rows = make_rows(count)
+
+    print(f"{count} tasks")
+    for name, hydrate in [("legacy Task", legacy_hydrate), ("Task.from_row", slotted_hydrate)]:
+        elapsed, allocated = measure(hydrate, rows)
+        print(f"{name:<14} {elapsed:6.2f}s  {allocated / 1024 / 1024:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# run_benchmarks.py - Time the TaskManager hot paths at several table sizes
+#
+# Run: python3 benchmarks/run_benchmarks.py [--sizes 100 1000 ...] [--profile safe]
+#      python3 benchmarks/run_benchmarks.py --save-baseline      (remember these numbers)
+#      python3 benchmarks/run_benchmarks.py                      (compare against them)
+#
+# Prints the results as JSON on stdout. If a baseline file exists, every
+# metric is compared with it on stderr, and the exit status is 1 when any
+# metric got slower by more than --threshold. Every number is a time, so
+# lower is always better. The 1e6 size takes a minute or two.
+#
+# Writes wait for fsync, which can vary by 20-30% between runs of the same
+# code. To compare code changes rather than disks, use --profile fast.
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_manager import DB_PROFILES, TaskManager, render_task_view
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000, 1000000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+PRIORITIES = ['low', 'medium', 'high']
+
+# Single-row operations timed per size (each add/delete is its own commit)
+SINGLE_OPS = 200
+# Counter reads are ~1 µs, so time a lot of them
+COUNTER_CALLS = 10000
+# next_tasks(NEXT_K) calls timed per size
+NEXT_CALLS = 1000
+NEXT_K = 10
+
+
+def timed(function, *args):
+    """Return (seconds, result) for one call"""
+    # Like timeit: a collection landing in one run but not another is most of the noise
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        result = function(*args)
+        return time.perf_counter() - start, result
+    finally:
+        gc.enable()
+
+
+def best_of(repeat, function, *args):
+    """Fastest of `repeat` calls, in seconds"""
+    return min(timed(function, *args)[0] for _ in range(repeat))
+
+
+def bench_size(path, size, profile, repeat):
+    """Run every benchmark against a fresh database of `size` tasks; return {metric: seconds}"""
+    rng = random.Random(size)
+    results = {}
+
+    # Bulk insert builds the table the other benchmarks use
+    with TaskManager(path, load=False, profile=profile) as manager:
+        rows = [(f"Task number {i} {rng.choice(['report', 'email', 'call', 'review'])}", rng.choice(PRIORITIES))
+                for i in range(size)]
+        results['add_tasks_s'], _ = timed(manager.add_tasks, rows)
+        # Complete about a third, in one transaction, so the view has every group
+        with manager.batch():
+            for task_id in rng.sample(range(1, size + 1), size // 3):
+                manager.mark_task_complete_by_id(task_id)
+
+    # Opening seeds the header counters with one GROUP BY
+    results['open_s'] = best_of(repeat, lambda: TaskManager(path, load=False, profile=profile).close())
+
+    with TaskManager(path, load=False, profile=profile) as manager:
+        def next_tasks():
+            for _ in range(NEXT_CALLS):
+                manager.next_tasks(NEXT_K)
+        # Not loaded yet, so this reads idx_tasks_urgency
+        results['next_tasks_sql_us'] = best_of(repeat, next_tasks) / NEXT_CALLS * 1e6
+
+        results['load_tasks_s'] = best_of(repeat, manager.load_tasks)
+        # Loaded: the first call builds the heap, the rest pop and push back NEXT_K entries
+        results['next_tasks_build_s'], _ = timed(manager.next_tasks, NEXT_K)
+        results['next_tasks_heap_us'] = best_of(repeat, next_tasks) / NEXT_CALLS * 1e6
+        results['get_tasks_by_priority_s'] = best_of(repeat, manager.get_tasks_by_priority)
+        results['render_view_s'] = best_of(repeat, lambda: render_task_view(manager.get_all_tasks()))
+
+        def read_counters():
+            for _ in range(COUNTER_CALLS):
+                manager.get_incomplete_count()
+                manager.get_completed_count()
+                manager.get_priority_counts()
+        results['counters_us'] = best_of(repeat, read_counters) / COUNTER_CALLS * 1e6
+
+        def add_singles():
+            for i in range(SINGLE_OPS):
+                manager.add_task(f"Single task {i}", PRIORITIES[i % 3])
+        results['add_task_us'] = timed(add_singles)[0] / SINGLE_OPS * 1e6
+
+        # Delete by position like the menu does, which rebuilds the list view each time
+        def delete_singles():
+            for _ in range(SINGLE_OPS):
+                manager.delete_task(rng.randrange(len(manager.tasks)))
+        results['delete_task_us'] = timed(delete_singles)[0] / SINGLE_OPS * 1e6
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison with the baseline on stderr; return the regressed metrics"""
+    regressions = []
+    print(f"{'size':>9}  {'metric':<24}{'baseline':>12}{'now':>12}{'change':>9}", file=sys.stderr)
+    for size, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(size, {}).get(metric)
+            if not old:
+                continue
+            change = value / old - 1
+            flag = ''
+            if change > threshold:
+                flag = '  ❌ slower'
+                regressions.append((size, metric))
+            elif change < -threshold:
+                flag = '  ✓ faster'
+            print(f"{size:>9}  {metric:<24}{old:>12.6g}{value:>12.6g}{change:>+9.0%}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark TaskManager hot paths")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('--profile', choices=sorted(DB_PROFILES), default='safe')
+    parser.add_argument('--repeat', type=int, default=5, help="runs of each read benchmark; the fastest counts")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="write these results to the baseline file")
+    parser.add_argument('--threshold', type=float, default=0.3,
+                        help="flag metrics more than this much slower than the baseline (default: 0.3)")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        # load_tasks() prints a message; keep stdout for the JSON
+        with tempfile.TemporaryDirectory() as tmp, redirect_stdout(sys.stderr):
+            results[str(size)] = bench_size(os.path.join(tmp, 'bench.db'), size, args.profile, args.repeat)
+        print(f"  {size:>9,} tasks done", file=sys.stderr)
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'machine': platform.platform(),
+            'profile': args.profile,
+        },
+        'results': results,
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['meta'].get('profile') != args.profile:
+            print(f"⚠️  baseline was run with the {baseline['meta'].get('profile')} profile", file=sys.stderr)
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
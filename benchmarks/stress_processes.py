@@ -0,0 +1,152 @@
+# stress_processes.py - Several processes writing to one database at once
+#
+# Run: python3 benchmarks/stress_processes.py [processes] [seconds] [profile]
+#      (default: 4 processes, 5 seconds, balanced)
+#
+# Every process keeps its own loaded TaskManager and only refreshes now and
+# then, so it often writes from a stale copy. Compare-and-swap should turn
+# those writes into TaskConflictErrors instead of lost updates. At the end
+# each surviving task's version must equal 1 + the number of updates that
+# some process was told succeeded. Exits with status 1 otherwise.
+#
+# The database starts out in the original schema (version 0), so every
+# process also has to get through opening and upgrading it at the same time.
+
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from task_manager import TaskConflictError, TaskManager
+
+PRIORITIES = ['low', 'medium', 'high']
+SEED_TASKS = 200          # a small table, so processes fight over the same rows
+# The tasks table as it was before any schema upgrades
+ORIGINAL_SCHEMA = '''
+    CREATE TABLE tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        description TEXT NOT NULL,
+        completed INTEGER DEFAULT 0,
+        priority TEXT DEFAULT 'medium',
+        created_at TEXT NOT NULL
+    )
+'''
+REFRESH_EVERY = 20        # operations between refresh() calls
+
+
+def worker(path, profile, seed, seconds):
+    """Run random writes for a while; return (operation counts, updates per task id, deleted ids)"""
+    rng = random.Random(seed)
+    counts = Counter()
+    updates = Counter()
+    deleted = []
+    manager = TaskManager(path, profile=profile)
+    stop_at = time.monotonic() + seconds
+    while time.monotonic() < stop_at:
+        if counts['ops'] % REFRESH_EVERY == 0:
+            manager.refresh()
+        counts['ops'] += 1
+        roll = rng.random()
+        try:
+            if roll < 0.05:
+                manager.add_task(f"Task from process {seed}", rng.choice(PRIORITIES))
+                counts['add'] += 1
+                continue
+            task = manager.get_task(rng.randrange(max(1, len(manager.tasks))))
+            if task is None:
+                continue
+            if roll < 0.50:
+                if task.completed:
+                    manager.mark_task_incomplete_by_id(task.id)
+                else:
+                    manager.mark_task_complete_by_id(task.id)
+            elif roll < 0.95:
+                others = [priority for priority in PRIORITIES if priority != task.priority]
+                manager.set_task_priority_by_id(task.id, rng.choice(others))
+            else:
+                manager.delete_task_by_id(task.id)
+                deleted.append(task.id)
+                counts['delete'] += 1
+                continue
+            updates[task.id] += 1
+            counts['update'] += 1
+        except TaskConflictError:
+            counts['conflict'] += 1
+        except sqlite3.OperationalError:
+            # Still locked after busy_timeout and every retry
+            counts['busy'] += 1
+    manager.close()
+    return counts, updates, deleted
+
+
+def check(path, updates, deleted):
+    """Compare row versions with the updates the processes saw succeed; return a list of problems"""
+    problems = []
+    twice = [task_id for task_id, times in Counter(deleted).items() if times > 1]
+    if twice:
+        problems.append(f"{len(twice)} task(s) deleted by more than one process")
+    conn = sqlite3.connect(path)
+    versions = dict(conn.execute('SELECT id, version FROM tasks'))
+    conn.close()
+    lost = [task_id for task_id, version in versions.items() if version != 1 + updates[task_id]]
+    if lost:
+        problems.append(f"{len(lost)} task(s) whose version doesn't match the successful updates (lost updates)")
+    still_there = [task_id for task_id in set(deleted) if task_id in versions]
+    if still_there:
+        problems.append(f"{len(still_there)} deleted task(s) still in the database")
+    with TaskManager(path, load=False) as manager:
+        if not manager.check_counts():
+            problems.append("counters don't match the database")
+    return problems
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+    profile = sys.argv[3] if len(sys.argv) > 3 else 'balanced'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stress.db')
+        # Written without TaskManager, so no process finds it upgraded already
+        conn = sqlite3.connect(path)
+        conn.execute(ORIGINAL_SCHEMA)
+        conn.executemany("INSERT INTO tasks (description, priority, created_at) VALUES (?, ?, datetime('now'))",
+                         [(f"Seed task {i}", PRIORITIES[i % 3]) for i in range(SEED_TASKS)])
+        conn.commit()
+        conn.close()
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(worker, [(path, profile, seed, seconds) for seed in range(processes)])
+        elapsed = time.perf_counter() - start
+
+        counts = Counter()
+        updates = Counter()
+        deleted = []
+        for process_counts, process_updates, process_deleted in results:
+            counts.update(process_counts)
+            updates.update(process_updates)
+            deleted.extend(process_deleted)
+        problems = check(path, updates, deleted)
+
+    writes = counts['add'] + counts['update'] + counts['delete']
+    attempts = writes + counts['conflict'] + counts['busy']
+    print(f"{processes} processes, {profile} profile, {elapsed:.1f}s: "
+          f"{writes} writes ({writes / elapsed:,.0f}/s)")
+    print(f"  add: {counts['add']}, update: {counts['update']}, delete: {counts['delete']}")
+    print(f"  conflicts: {counts['conflict']} ({counts['conflict'] / max(1, attempts):.1%} of attempts), "
+          f"still busy after retries: {counts['busy']}")
+    for problem in problems:
+        print(f"  ❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print("  ✓ no lost updates; counters match the database")
+
+
+if __name__ == "__main__":
+    main()
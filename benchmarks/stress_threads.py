@@ -0,0 +1,121 @@
+# stress_threads.py - Many threads doing mixed operations on one ThreadSafeTaskManager
+#
+# Run: python3 benchmarks/stress_threads.py [threads] [seconds]   (default: 16 threads, 5 seconds)
+#
+# Exits with status 1 if any operation raised or the final state is inconsistent.
+
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from threadsafe_task_manager import ThreadSafeTaskManager
+
+PRIORITIES = ['low', 'medium', 'high']
+
+
+def worker(manager, seed, stop, op_counts, errors):
+    """Pick random operations until told to stop"""
+    rng = random.Random(seed)
+    counts = Counter()
+    while not stop.is_set():
+        # Ids near the top of the table, so writes and reads collide often
+        high_id = max(1, manager.get_task_count() + 200)
+        task_id = rng.randint(1, high_id)
+        roll = rng.random()
+        try:
+            if roll < 0.15:
+                manager.add_task(f"Task from thread {seed}", rng.choice(PRIORITIES))
+                counts['add'] += 1
+            elif roll < 0.25:
+                manager.mark_task_complete_by_id(task_id)
+                counts['complete'] += 1
+            elif roll < 0.35:
+                manager.set_task_priority_by_id(task_id, rng.choice(PRIORITIES))
+                counts['priority'] += 1
+            elif roll < 0.40:
+                manager.delete_task_by_id(task_id)
+                counts['delete'] += 1
+            elif roll < 0.42:
+                with manager.batch():
+                    manager.add_task("Batched task", 'low')
+                    manager.mark_task_incomplete_by_id(task_id)
+                counts['batch'] += 1
+            elif roll < 0.70:
+                manager.get_task_by_id(task_id)
+                counts['get'] += 1
+            elif roll < 0.80:
+                manager.get_incomplete_count()
+                manager.get_priority_counts()
+                counts['counts'] += 1
+            elif roll < 0.85:
+                manager.get_tasks_by_priority()
+                counts['grouped'] += 1
+            elif roll < 0.93:
+                manager.search("thread")
+                counts['search'] += 1
+            else:
+                for _, _ in zip(range(50), manager.iter_tasks(completed=False, order_by='created_at')):
+                    pass
+                counts['scan'] += 1
+        except Exception as error:  # report every failure, keep going
+            errors.append(repr(error))
+    op_counts.update(counts)
+
+
+def check_consistency(manager):
+    """Compare the identity map and counters with the database; return a list of problems"""
+    problems = []
+    if not manager.check_counts():
+        problems.append("counters don't match the database")
+    in_memory = {task.id: (task.completed, task.priority) for task in manager.tasks}
+    in_db = {task.id: (task.completed, task.priority) for task in manager.iter_tasks()}
+    if in_memory != in_db:
+        problems.append(f"identity map differs from database for {len(set(in_memory.items()) ^ set(in_db.items()))} task(s)")
+    return problems
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = ThreadSafeTaskManager(os.path.join(tmp, 'stress.db'))
+        manager.add_tasks((f"Seed task {i}", PRIORITIES[i % 3]) for i in range(5000))
+
+        stop = threading.Event()
+        op_counts = Counter()
+        errors = []
+        workers = [threading.Thread(target=worker, args=(manager, seed, stop, op_counts, errors))
+                   for seed in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        problems = check_consistency(manager)
+        manager.close()
+
+    total = sum(op_counts.values())
+    print(f"{threads} threads, {elapsed:.1f}s: {total} operations ({total / elapsed:,.0f} ops/s)")
+    print("  " + ", ".join(f"{name}: {count}" for name, count in sorted(op_counts.items())))
+    print(f"  errors: {len(errors)}")
+    for error in Counter(errors).most_common(5):
+        print(f"    {error[1]} x {error[0]}")
+    for problem in problems:
+        print(f"  ❌ {problem}")
+    if errors or problems:
+        sys.exit(1)
+    print("  ✓ identity map and counters match the database")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+# columnar_store.py
+# Column-per-field task storage for very large task lists
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from task_manager import PRIORITIES, PRIORITY_CODES, MEDIUM, Task
+
+# NumPy is optional: with it, filters and counts run as vectorized
+# operations over the arrays; without it we fall back to plain loops
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ColumnarTaskStore:
+    """Keeps tasks as typed arrays instead of one Python object per task"""
+
+    def __init__(self):
+        # One entry per row, rows kept in ascending id order
+        self.ids = array('q')
+        self.completed = array('b')
+        self.priority_codes = array('b')
+        self.created_at = array('d')        # seconds since the epoch
+        self.deleted = array('b')           # deleted rows are flagged, not removed
+        # All descriptions packed into one UTF-8 buffer;
+        # row i is description_data[offsets[i]:offsets[i + 1]]
+        self.description_data = bytearray()
+        self.description_offsets = array('q', [0])
+        # Task objects for all_tasks(), dropped whenever a row changes
+        self._tasks = None
+
+    @classmethod
+    def from_database(cls, conn, batch_size=10000):
+        """Read every task from an open SQLite connection"""
+        store = cls()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, description, completed, priority, created_at FROM tasks ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for task_id, description, completed, priority, created_at in rows:
+                store.append(task_id, description, completed,
+                             PRIORITY_CODES.get(priority, MEDIUM),
+                             datetime.fromisoformat(created_at).timestamp())
+        return store
+
+    def __len__(self):
+        """Number of live (not deleted) tasks"""
+        if self._tasks is not None:
+            return len(self._tasks)
+        return len(self.ids) - self.deleted.count(1)
+
+    # ----- Row access -----
+
+    def append(self, task_id, description, completed, priority_code, created_at):
+        """Add a row; ids must be added in increasing order"""
+        if self.ids and task_id <= self.ids[-1]:
+            raise ValueError("Rows must be appended in increasing id order")
+        self._tasks = None
+        self.ids.append(task_id)
+        self.completed.append(int(bool(completed)))
+        self.priority_codes.append(priority_code)
+        self.created_at.append(created_at)
+        self.deleted.append(0)
+        self.description_data += description.encode('utf-8')
+        self.description_offsets.append(len(self.description_data))
+
+    def append_task(self, task):
+        """Add a Task object as a new row"""
+        self.append(task.id, task.description, task.completed,
+                    PRIORITY_CODES[task.priority], task.created_at.timestamp())
+
+    def row_of(self, task_id):
+        """Return the row number for a task id, or None"""
+        # ids are sorted, so a binary search replaces an id -> row dict
+        row = bisect_left(self.ids, task_id)
+        if row < len(self.ids) and self.ids[row] == task_id and not self.deleted[row]:
+            return row
+        return None
+
+    def description(self, row):
+        """Decode one description from the packed buffer"""
+        start = self.description_offsets[row]
+        end = self.description_offsets[row + 1]
+        return self.description_data[start:end].decode('utf-8')
+
+    def task(self, row):
+        """Build a Task object for one row"""
+        # from_row skips the validation the rows already passed on the way in
+        task = Task.from_row(self.ids[row], self.description(row), self.completed[row],
+                             PRIORITIES[self.priority_codes[row]], None)
+        task.created_at = datetime.fromtimestamp(self.created_at[row])
+        return task
+
+    def all_tasks(self):
+        """Return Task objects for every live row, in id order (cached until a row changes)"""
+        if self._tasks is None:
+            self._tasks = [self.task(row) for row in self.filter()]
+        return self._tasks
+
+    def update_task(self, task):
+        """Copy a Task's completed flag and priority into its row"""
+        self.update(task.id, completed=task.completed, priority=task.priority)
+
+    def update(self, task_id, completed=None, priority=None):
+        """Change a row's completed flag and/or priority"""
+        row = self.row_of(task_id)
+        if row is not None:
+            self._tasks = None
+            if completed is not None:
+                self.completed[row] = int(completed)
+            if priority is not None:
+                self.priority_codes[row] = PRIORITY_CODES[priority]
+
+    def delete(self, task_id):
+        """Flag a task's row as deleted"""
+        row = self.row_of(task_id)
+        if row is not None:
+            self._tasks = None
+            self.deleted[row] = 1
+
+    def remove_last(self, task_id):
+        """Take back the most recently appended row (used when a batch rolls back)"""
+        self._tasks = None
+        if self.ids and self.ids[-1] == task_id:
+            for column in (self.ids, self.completed, self.priority_codes, self.created_at, self.deleted):
+                column.pop()
+            self.description_offsets.pop()
+            del self.description_data[self.description_offsets[-1]:]
+        else:
+            self.delete(task_id)
+
+    def restore(self, task_id):
+        """Clear the deleted flag on a task's row"""
+        row = bisect_left(self.ids, task_id)
+        if row < len(self.ids) and self.ids[row] == task_id:
+            self._tasks = None
+            self.deleted[row] = 0
+
+    # ----- Filtering, counting and sorting -----
+
+    def filter(self, completed=None, priority=None):
+        """Return the row numbers (in id order) matching the filters"""
+        code = PRIORITY_CODES[priority] if priority is not None else None
+        if np is not None:
+            mask = np.frombuffer(self.deleted, dtype=np.int8) == 0
+            if completed is not None:
+                mask &= np.frombuffer(self.completed, dtype=np.int8) == int(completed)
+            if code is not None:
+                mask &= np.frombuffer(self.priority_codes, dtype=np.int8) == code
+            return np.flatnonzero(mask).tolist()
+
+        rows = []
+        for row in range(len(self.ids)):
+            if self.deleted[row]:
+                continue
+            if completed is not None and self.completed[row] != int(completed):
+                continue
+            if code is not None and self.priority_codes[row] != code:
+                continue
+            rows.append(row)
+        return rows
+
+    def count_by_priority(self, completed):
+        """Return {'low': n, 'medium': n, 'high': n} for completed or incomplete tasks"""
+        if np is not None:
+            mask = ((np.frombuffer(self.deleted, dtype=np.int8) == 0)
+                    & (np.frombuffer(self.completed, dtype=np.int8) == int(completed)))
+            codes = np.frombuffer(self.priority_codes, dtype=np.int8)[mask]
+            counts = np.bincount(codes, minlength=len(PRIORITIES)).tolist()
+        else:
+            counts = [0] * len(PRIORITIES)
+            for row in range(len(self.ids)):
+                if not self.deleted[row] and self.completed[row] == int(completed):
+                    counts[self.priority_codes[row]] += 1
+        return dict(zip(PRIORITIES, counts))
+
+    def sort(self, rows, by='created_at', reverse=False):
+        """Return the given row numbers sorted by a column"""
+        column = {'id': self.ids, 'created_at': self.created_at, 'priority': self.priority_codes}[by]
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.dtype(column.typecode))
+            rows = np.asarray(rows, dtype=np.int64)
+            # Stable sort so ties keep id order
+            order = rows[np.argsort(values[rows], kind='stable')]
+            if reverse:
+                order = order[::-1]
+            return order.tolist()
+        return sorted(rows, key=column.__getitem__, reverse=reverse)
+
+    # ----- Same queries as TaskManager -----
+
+    def get_incomplete_count(self):
+        """Return number of incomplete tasks"""
+        return sum(self.count_by_priority(False).values())
+
+    def get_completed_count(self):
+        """Return number of completed tasks"""
+        return sum(self.count_by_priority(True).values())
+
+    def get_tasks_by_priority(self):
+        """Return tasks grouped by priority (as Task objects, in id order)"""
+        high = [self.task(row) for row in self.filter(completed=False, priority='high')]
+        medium = [self.task(row) for row in self.filter(completed=False, priority='medium')]
+        low = [self.task(row) for row in self.filter(completed=False, priority='low')]
+        completed = [self.task(row) for row in self.filter(completed=True)]
+        return high, medium, low, completed
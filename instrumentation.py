@@ -0,0 +1,305 @@
+# instrumentation.py
+# Opt-in timing for TaskManager methods and the SQL they run
+
+import cProfile
+import inspect
+import json
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Latencies kept per operation for the percentiles. Past this many calls
+# we keep a random sample (reservoir sampling), so memory stays bounded.
+SAMPLE_SIZE = 10000
+
+# Public methods that aren't worth timing as calls
+SKIP_METHODS = {'batch'}
+
+
+class _Stat:
+    """Running totals and a latency sample for one operation"""
+
+    __slots__ = ('calls', 'total', 'max', 'rows', 'bytes', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.bytes = 0
+        self.samples = []
+
+
+class Instrumentation:
+    """Collects call counts, latency percentiles, rows and bytes per operation
+
+    Operations are named "method:<name>" for TaskManager methods and
+    "sql:<statement>" for SQL. Method times include the SQL they ran.
+    Nothing here runs unless a TaskManager was created with instrument=True.
+    """
+
+    def __init__(self, sample_size=SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+
+    def _stat(self, name):
+        stat = self._stats.get(name)
+        if stat is None:
+            stat = self._stats[name] = _Stat()
+        return stat
+
+    def record(self, name, seconds, rows=0, nbytes=0):
+        """Count one call of an operation that took `seconds`"""
+        with self._lock:
+            stat = self._stat(name)
+            stat.calls += 1
+            stat.total += seconds
+            stat.rows += rows
+            stat.bytes += nbytes
+            if seconds > stat.max:
+                stat.max = seconds
+            if len(stat.samples) < self.sample_size:
+                stat.samples.append(seconds)
+            else:
+                slot = self._random.randrange(stat.calls)
+                if slot < self.sample_size:
+                    stat.samples[slot] = seconds
+
+    def add(self, name, seconds, rows=0, nbytes=0):
+        """Add time, rows and bytes to an operation without counting a call (row fetching)"""
+        with self._lock:
+            stat = self._stat(name)
+            stat.total += seconds
+            stat.rows += rows
+            stat.bytes += nbytes
+
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self._stats = {}
+
+    # ----- Hooks -----
+
+    def wrap_methods(self, manager):
+        """Time every public method of a TaskManager, by shadowing them on the instance"""
+        for name in dir(type(manager)):
+            if name.startswith('_') or name in SKIP_METHODS:
+                continue
+            # Look on the class, so properties like .tasks aren't triggered
+            if not inspect.isfunction(getattr(type(manager), name)):
+                continue
+            method = getattr(manager, name)
+            if inspect.isgeneratorfunction(method):
+                setattr(manager, name, self._timed_generator('method:' + name, method))
+            else:
+                setattr(manager, name, self._timed_call('method:' + name, method))
+
+    def _timed_call(self, name, method):
+        @wraps(method)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed
+
+    def _timed_generator(self, name, method):
+        # Count the time spent producing items, not the time the caller spends between them
+        @wraps(method)
+        def timed(*args, **kwargs):
+            elapsed = 0.0
+            items = 0
+            generator = method(*args, **kwargs)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        elapsed += time.perf_counter() - start
+                        return
+                    elapsed += time.perf_counter() - start
+                    items += 1
+                    yield item
+            finally:
+                generator.close()
+                self.record(name, elapsed, rows=items)
+        return timed
+
+    def wrap_connection(self, conn):
+        """Return a stand-in for an sqlite3 connection that times every statement"""
+        return _ConnectionProxy(conn, self)
+
+    # ----- Reports -----
+
+    def stats(self):
+        """Return {operation: {calls, total_ms, p50_ms, p95_ms, p99_ms, max_ms, rows, bytes}}"""
+        with self._lock:
+            items = [(name, stat, sorted(stat.samples)) for name, stat in self._stats.items()]
+        report = {}
+        for name, stat, samples in sorted(items, key=lambda item: -item[1].total):
+            report[name] = {
+                'calls': stat.calls,
+                'total_ms': stat.total * 1000,
+                'p50_ms': _percentile(samples, 50) * 1000,
+                'p95_ms': _percentile(samples, 95) * 1000,
+                'p99_ms': _percentile(samples, 99) * 1000,
+                'max_ms': stat.max * 1000,
+                'rows': stat.rows,
+                'bytes': stat.bytes,
+            }
+        return report
+
+    def to_json(self):
+        """Stats as a JSON string"""
+        return json.dumps(self.stats(), indent=2)
+
+    def table(self, limit=None):
+        """Stats as a text table, slowest (by total time) first"""
+        rows = list(self.stats().items())[:limit]
+        lines = [f"{'operation':<52}{'calls':>8}{'total ms':>11}{'p50 ms':>9}{'p95 ms':>9}"
+                 f"{'p99 ms':>9}{'rows':>10}{'bytes':>12}"]
+        for name, stat in rows:
+            if len(name) > 50:
+                name = name[:49] + '…'
+            lines.append(f"{name:<52}{stat['calls']:>8}{stat['total_ms']:>11.2f}{stat['p50_ms']:>9.3f}"
+                         f"{stat['p95_ms']:>9.3f}{stat['p99_ms']:>9.3f}{stat['rows']:>10}{stat['bytes']:>12}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, target):
+        """Write the table to stderr ('-') or the JSON to a file"""
+        if target == '-':
+            sys.stderr.write(self.table())
+            return
+        with open(target, 'w', encoding='utf-8') as out:
+            out.write(self.to_json())
+        print(f"📈 Stats written to {target}", file=sys.stderr)
+
+
+def _percentile(samples, percent):
+    """Nearest-rank percentile of a sorted list (0 if empty)"""
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, len(samples) * percent // 100)]
+
+
+def _statement_name(sql):
+    """Operation name for a statement: whitespace collapsed, so one query is one row"""
+    return 'sql:' + re.sub(r'\s+', ' ', sql).strip()
+
+
+def _row_bytes(rows):
+    """Rough size of fetched rows: text and blobs by length, numbers as 8 bytes"""
+    total = 0
+    for row in rows:
+        for value in row:
+            total += len(value) if isinstance(value, (str, bytes)) else 8
+    return total
+
+
+class _ConnectionProxy:
+    """Passes everything through to the real connection, timing statements and commits"""
+
+    def __init__(self, conn, instrumentation):
+        self._conn = conn
+        self._instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return _CursorProxy(self._conn.cursor(), self._instrumentation)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self._conn.commit()
+        finally:
+            self._instrumentation.record('sql:COMMIT', time.perf_counter() - start)
+
+    def rollback(self):
+        start = time.perf_counter()
+        try:
+            self._conn.rollback()
+        finally:
+            self._instrumentation.record('sql:ROLLBACK', time.perf_counter() - start)
+
+
+class _CursorProxy:
+    """Times execute calls; rows and bytes fetched are added to the statement that produced them"""
+
+    def __init__(self, cursor, instrumentation):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        self._name = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _run(self, run, sql, params):
+        self._name = _statement_name(sql)
+        start = time.perf_counter()
+        try:
+            run(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            # For writes rowcount is the rows changed; SELECTs count rows as they're fetched
+            self._instrumentation.record(self._name, elapsed, rows=max(self._cursor.rowcount, 0))
+        return self
+
+    def execute(self, sql, params=()):
+        return self._run(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, params):
+        return self._run(self._cursor.executemany, sql, params)
+
+    def _fetched(self, start, rows):
+        self._instrumentation.add(self._name, time.perf_counter() - start, len(rows), _row_bytes(rows))
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(start, [row] if row is not None else [])
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(start, rows)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(start, rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+
+@contextmanager
+def profiled(path):
+    """Run the block under cProfile and save the result to `path`"""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"📈 Profile written to {path} (view with: python3 -m pstats {path})", file=sys.stderr)
@@ -0,0 +1,157 @@
+# task_io.py
+# Streaming readers and writers for importing and exporting tasks
+
+import csv
+import json
+from contextlib import nullcontext
+
+from task_manager import Task
+
+# Exported columns, in order (CSV header, and the keys of JSON records)
+EXPORT_FIELDS = ['id', 'description', 'completed', 'priority', 'created_at']
+
+# How much of a JSON file to read at a time
+CHUNK_SIZE = 64 * 1024
+
+# Ways of writing "completed" in a CSV file that mean True
+TRUE_STRINGS = {'1', 'true', 'yes', 'y', 'x', '✓'}
+
+
+def open_text(source, mode):
+    """Open a path for reading or writing text, or pass an already open file through"""
+    if hasattr(source, 'read') or hasattr(source, 'write'):
+        return nullcontext(source)
+    # newline='' is what the csv module wants; JSON doesn't mind
+    return open(source, mode, encoding='utf-8', newline='')
+
+
+# ===== READERS =====
+class _JsonStream:
+    """A JSON text read in chunks, decoded one value at a time with raw_decode"""
+
+    def __init__(self, file, chunk_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Read another chunk; return False at the end of the file"""
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        # Drop what has been decoded, so the buffer stays about a chunk long
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character ('' at the end of the file)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def decode(self):
+        """Decode the next value, reading more of the file until it is complete"""
+        self.peek()     # raw_decode doesn't skip leading whitespace
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Probably cut off at the end of the buffer
+                if self._fill():
+                    continue
+                raise
+            # A number at the very end of the buffer might carry on in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_array(file, chunk_size=CHUNK_SIZE):
+    """Yield the items of a top-level JSON array (like tasks.json) without loading the whole file"""
+    stream = _JsonStream(file, chunk_size)
+    if stream.peek() != '[':
+        raise ValueError("Expected a JSON array of tasks")
+    stream.pos += 1
+    if stream.peek() == ']':
+        return
+    while True:
+        yield stream.decode()
+        separator = stream.peek()
+        stream.pos += 1
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' between tasks, found {separator or 'end of file'!r}")
+
+
+def iter_ndjson(file):
+    """Yield one record per non-blank line of a newline-delimited JSON file"""
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_csv(file):
+    """Yield one record per row of a CSV file with a header row"""
+    yield from csv.DictReader(file)
+
+
+def task_from_record(record):
+    """Build a new Task from an imported record (any id in the record is not kept)"""
+    if not isinstance(record, dict) or not record.get('description'):
+        raise ValueError(f"Not a task (needs a description): {record!r}")
+    completed = record.get('completed', False)
+    if isinstance(completed, str):
+        completed = completed.strip().lower() in TRUE_STRINGS
+    return Task(record['description'],
+                completed=bool(completed),
+                created_at=record.get('created_at') or None,
+                priority=record.get('priority') or 'medium')
+
+
+# ===== WRITERS =====
+def export_record(task):
+    """The record written for one task: Task.to_dict() plus the id"""
+    return {'id': task.id, **task.to_dict()}
+
+
+def write_json_array(file, records):
+    """Write records as a JSON array, one at a time, laid out like the old tasks.json; return the count"""
+    count = 0
+    file.write('[')
+    for record in records:
+        file.write(',\n  ' if count else '\n  ')
+        file.write(json.dumps(record, indent=2).replace('\n', '\n  '))
+        count += 1
+    file.write('\n]\n' if count else ']\n')
+    return count
+
+
+def write_ndjson(file, records):
+    """Write one JSON record per line; return the count"""
+    count = 0
+    for record in records:
+        file.write(json.dumps(record) + '\n')
+        count += 1
+    return count
+
+
+def write_csv(file, records):
+    """Write records as CSV with a header row; return the count"""
+    writer = csv.DictWriter(file, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    count = 0
+    for record in records:
+        writer.writerow(record)
+        count += 1
+    return count
@@ -1,28 +1,80 @@
 # task_manager.py
 # A simple command-line task manager
 
-import json
+import atexit
+import heapq
+import os
+import random
 import sqlite3
-from datetime import datetime
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+from itertools import islice
 
 # ===== TASK CLASS =====
+# Priorities are stored on a Task as a small int code (index into PRIORITIES)
+PRIORITIES = ('low', 'medium', 'high')
+PRIORITY_CODES = {name: code for code, name in enumerate(PRIORITIES)}
+MEDIUM = PRIORITY_CODES['medium']
+
 class Task:
     """Represents a single task"""
     
+    # No per-instance __dict__: keeps a million loaded tasks small
+    __slots__ = ('id', 'description', 'completed', 'version', '_priority_code', '_created_at', '_created_at_text')
+    
     def __init__(self, description, completed=False, created_at=None, priority='medium', task_id=None):
         self.id = task_id
         self.description = description
         self.completed = completed
+        # The row's version number when we read it (new rows start at 1)
+        self.version = 1
         # Validate and set priority
-        if isinstance(priority, str) and priority.lower() in ['low', 'medium', 'high']:
-            self.priority = priority.lower()
+        if isinstance(priority, str) and priority.lower() in PRIORITY_CODES:
+            self._priority_code = PRIORITY_CODES[priority.lower()]
         else:
-            self.priority = 'medium'
+            self._priority_code = MEDIUM
         # If created_at is provided (loading from file), use it. Otherwise, use now.
         if created_at:
-            self.created_at = datetime.fromisoformat(created_at)
+            self._created_at = datetime.fromisoformat(created_at)
         else:
-            self.created_at = datetime.now()
+            self._created_at = datetime.now()
+        self._created_at_text = None
+    
+    @classmethod
+    def from_row(cls, task_id, description, completed, priority, created_at, version=1):
+        """Fast constructor for rows read from our own database (no validation)"""
+        task = cls.__new__(cls)
+        task.id = task_id
+        task.description = description
+        task.completed = bool(completed)
+        task.version = version
+        task._priority_code = PRIORITY_CODES.get(priority, MEDIUM)
+        # Keep the ISO string and only parse it if someone asks for created_at
+        task._created_at = None
+        task._created_at_text = created_at
+        return task
+    
+    @property
+    def priority(self):
+        return PRIORITIES[self._priority_code]
+    
+    @priority.setter
+    def priority(self, value):
+        self._priority_code = PRIORITY_CODES.get(value, MEDIUM)
+    
+    @property
+    def created_at(self):
+        if self._created_at is None:
+            self._created_at = datetime.fromisoformat(self._created_at_text)
+        return self._created_at
+    
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = value
+        self._created_at_text = None
     
     def mark_complete(self):
         """Mark this task as completed"""
@@ -39,11 +91,19 @@ class Task:
     def set_priority(self, priority):
         """Set the priority of the task"""
         #
-        if isinstance(priority, str) and priority.lower() in ['low', 'medium', 'high']:
-            self.priority = priority.lower()
+        if isinstance(priority, str) and priority.lower() in PRIORITY_CODES:
+            self._priority_code = PRIORITY_CODES[priority.lower()]
             return True
         return False
     
+    def urgency_key(self):
+        """Sort key for next_tasks(): lower is more urgent (see URGENCY_DAYS_PER_PRIORITY)"""
+        # Parse without caching, so building the queue doesn't keep a datetime per task
+        created = self._created_at or datetime.fromisoformat(self._created_at_text)
+        seconds = created.hour * 3600 + created.minute * 60 + created.second + created.microsecond / 1e6
+        # Days since 0001-01-01, like URGENCY_ORDER's julianday() up to a constant
+        return created.toordinal() + seconds / 86400 - self._priority_code * URGENCY_DAYS_PER_PRIORITY
+
     def to_dict(self):
         """Convert task to dictionary for JSON saving"""
         return {
@@ -67,20 +127,527 @@ class Task:
         
         return f"[{status}] {priority_symbol} {self.description}"
 
+# ===== SEARCH =====
+def build_search_query(text):
+    """Turn what the user typed into an FTS5 query
+
+    Words become prefix matches ("gro" finds "groceries") and text in
+    double quotes is matched as an exact phrase. All parts must match.
+    """
+    import re
+
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        if phrase.strip():
+            parts.append('"' + phrase.strip().replace('"', '""') + '"')
+        elif word:
+            parts.append('"' + word.replace('"', '""') + '"*')
+    return ' AND '.join(parts)
+
 # ===== TASK MANAGER CLASS =====
+class TaskConflictError(Exception):
+    """Raised when a task was changed or deleted by someone else since we read it"""
+
+    def __init__(self, task_ids):
+        self.task_ids = list(task_ids)
+        ids = ', '.join(f'#{task_id}' for task_id in self.task_ids)
+        super().__init__(f"Task {ids} was changed by someone else; reloaded the latest version")
+
+
+def _is_busy(error):
+    """True if an sqlite3 error means another connection holds the lock"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _cutoff(older_than):
+    """ISO timestamp for "older than": a datetime, a timedelta, or a number of days"""
+    if isinstance(older_than, (int, float)):
+        older_than = timedelta(days=older_than)
+    if isinstance(older_than, timedelta):
+        older_than = datetime.now() - older_than
+    return older_than.isoformat()
+
+
+# Bump this (and add an upgrade step in _init_database) when the schema changes
+SCHEMA_VERSION = 6
+
+# Connection settings applied as PRAGMAs when TaskManager opens the database.
+#   safe:     SQLite's defaults - fsync on every commit, and the journal mode
+#             the file already has (rollback journal for a new file)
+#   balanced: WAL journal, fsync only at checkpoints (a crash can lose the
+#             last commits but never corrupts the database), bigger cache
+#   fast:     no fsync at all - for throwaway or rebuildable databases
+# busy_timeout is how long (ms) SQLite waits for another process's lock
+# before giving up with "database is locked". A journal_mode of None keeps
+# the file's mode: switching needs every other connection closed, and the
+# mode is stored in the file, so forcing it would break other processes.
+DB_PROFILES = {
+    'safe': {'journal_mode': None, 'synchronous': 'full', 'cache_size': -2000,
+             'mmap_size': 0, 'temp_store': 'default', 'busy_timeout': 5000},
+    'balanced': {'journal_mode': 'wal', 'synchronous': 'normal', 'cache_size': -16000,
+                 'mmap_size': 64 * 1024 * 1024, 'temp_store': 'memory', 'busy_timeout': 5000},
+    'fast': {'journal_mode': 'wal', 'synchronous': 'off', 'cache_size': -64000,
+             'mmap_size': 256 * 1024 * 1024, 'temp_store': 'memory', 'busy_timeout': 5000},
+}
+
+# Days that tombstones and the counter change log are kept. A process that
+# hasn't refreshed for longer than this reloads everything instead.
+CHANGE_RETENTION_DAYS = 7
+
+# First pause (seconds) before retrying a write that found the database busy;
+# it doubles on each of the max_retries attempts, with some jitter
+RETRY_DELAY = 0.01
+
+# Values each text setting may take (they are pasted into PRAGMA statements)
+SETTING_CHOICES = {
+    'journal_mode': {'delete', 'truncate', 'persist', 'memory', 'wal', 'off'},
+    'synchronous': {'off', 'normal', 'full', 'extra'},
+    'temp_store': {'default', 'file', 'memory'},
+}
+
+# Orderings accepted by TaskManager.iter_tasks()
+TASK_ORDERINGS = {
+    'id': 'id',
+    'created_at': 'created_at, id',
+    'priority': "CASE priority WHEN 'high' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END, id",
+}
+
+# How many days of waiting one priority level is worth when picking the next
+# task: a medium task created a week before a high one ranks level with it.
+# Age grows at the same rate for every task, so the order never changes by
+# itself and a heap (or an index) can keep it.
+URGENCY_DAYS_PER_PRIORITY = 7
+# The same order in SQL. idx_tasks_urgency indexes exactly this expression,
+# so a change here needs a schema upgrade for the index to be used again.
+URGENCY_ORDER = ("julianday(created_at) - "
+                 f"CASE priority WHEN 'high' THEN {2 * URGENCY_DAYS_PER_PRIORITY} WHEN 'low' THEN 0 "
+                 f"ELSE {URGENCY_DAYS_PER_PRIORITY} END")
+
+# Records per transaction when importing (see TaskManager.import_json)
+IMPORT_BATCH_SIZE = 10000
+
+# Default age (days since completion) at which archive_completed() moves a task
+ARCHIVE_AFTER_DAYS = 30
+
 class TaskManager:
     """Manages a collection of tasks using SQLite DB"""
     
-    def __init__(self, db_name='tasks.db'):
+    # Guards the identity map, list view and counters. A TaskManager is used
+    # from one thread, so this does nothing; ThreadSafeTaskManager swaps in a real lock.
+    _map_lock = nullcontext()
+    # Held while a transaction is open on the connection. Only the write-behind
+    # flush timer uses it from another thread, so otherwise this does nothing.
+    _conn_lock = nullcontext()
+    # Set when created with instrument=True (see instrumentation.py)
+    instrumentation = None
+    
+    def __init__(self, db_name='tasks.db', load=True, columnar=False, profile='safe',
+                 journal_mode=None, synchronous=None, cache_size=None, mmap_size=None, temp_store=None,
+                 busy_timeout=None, max_retries=5,
+                 write_behind=False, flush_interval_ms=200, flush_every=100, instrument=False,
+                 auto_archive_days=None):
         self.db_name = db_name
-        self.tasks = []
+        # Start from the named profile, then apply any explicit settings
+        if profile not in DB_PROFILES:
+            raise ValueError(f"Unknown profile: {profile} (choose from {', '.join(DB_PROFILES)})")
+        self.settings = dict(DB_PROFILES[profile])
+        overrides = {'journal_mode': journal_mode, 'synchronous': synchronous, 'cache_size': cache_size,
+                     'mmap_size': mmap_size, 'temp_store': temp_store, 'busy_timeout': busy_timeout}
+        self.settings.update({name: value for name, value in overrides.items() if value is not None})
+        self._check_settings()
+        # Extra attempts for a write that still finds the database locked after busy_timeout
+        self.max_retries = max_retries
+        # Identity map: task id -> Task. Dicts keep insertion order,
+        # so this is also the display order (oldest id first).
+        self._tasks_by_id = {}
+        # Cached list view of _tasks_by_id for positional access (None = stale)
+        self._task_list = None
+        # True once every row has been read into the identity map
+        self.loaded = False
+        # Task counts keyed by (completed, priority), kept up to date by every
+        # mutation so the menu header never has to walk the tasks. None until
+        # something asks for a count (see _seed_counts)
+        self._counts = None
+        self._base_counts = None
+        # How many batch() blocks we are inside. While > 0 nothing commits on
+        # its own, and _undo_log records how to reverse in-memory changes
+        self._batch_depth = 0
+        self._undo_log = []
+        self._undo_unsorted = False     # set when an undone delete lands out of id order
+        # Looked up on the first search (see _search_index_available)
+        self._has_search_index = None
+        # Heap of (urgency key, task id, priority code) for next_tasks(), built on
+        # first use. Entries aren't removed when a task changes; a new one is
+        # pushed and the old one is skipped when it comes to the top.
+        self._queue = None
+        # Write-behind mode: updates and deletes wait in memory and are written
+        # together by flush(). Several changes to one task are written once.
+        self.write_behind = write_behind
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_every = flush_every
+        self._pending_updates = {}      # task id -> {column: value}
+        self._pending_deletes = set()
+        self._pending_versions = {}     # task id -> version the queued change was based on
+        self._flush_timer = None        # threading.Timer started by the oldest queued change
+        self._flush_error = None        # conflict the timer hit, raised by the next flush()
+        if write_behind:
+            # Kept, because instrument=True later swaps self.flush for a wrapper
+            # that atexit.unregister() wouldn't recognise
+            self._atexit_flush = self.flush
+            atexit.register(self._atexit_flush)
+            if flush_interval_ms is not None:
+                # The timer flushes from its own thread, through the same connection,
+                # and a conflict it hits refreshes the identity map from there
+                self._conn_lock = threading.RLock()
+                self._map_lock = threading.RLock()
+        # Sync position for refresh(), read once the schema is ready
+        self._data_version = self._sync_seq = None
+        # One connection for the lifetime of the manager.
+        # Opening a new connection for every operation was most of the cost.
+        self.conn = self._connect()
+        if instrument:
+            # Only done when asked for, so normal runs pay nothing for it
+            from instrumentation import Instrumentation
+            self.instrumentation = Instrumentation()
+            self.conn = self.instrumentation.wrap_connection(self.conn)
+            self.instrumentation.wrap_methods(self)
+        self._apply_settings()
         self._init_database()
-        self.load_tasks()
+        self._prune_if_due()
+        # Where refresh() should start looking for other processes' changes
+        self._data_version, self._sync_seq = self._sync_position()
+        # Optional column-per-field copy of the tasks (see columnar_store.py),
+        # used instead of Task objects when holding millions of tasks
+        self.columnar = None
+        # Move old completed tasks out of the way before anything reads them
+        if auto_archive_days is not None:
+            self.archive_completed(auto_archive_days)
+        if columnar:
+            from columnar_store import ColumnarTaskStore
+            self.columnar = ColumnarTaskStore.from_database(self.conn)
+        elif load:
+            self.load_tasks()
+    
+    def close(self):
+        """Close the database connection"""
+        if self.conn is not None:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+            with self._conn_lock:
+                try:
+                    self.flush()
+                finally:
+                    # Even when the last flush hit a conflict
+                    if self.write_behind:
+                        atexit.unregister(self._atexit_flush)
+                    self.conn.close()
+                    self.conn = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def _connect(self):
+        """Open the connection used for all writes"""
+        # The write-behind flush timer uses it from its own thread
+        timed = self.write_behind and self.flush_interval_ms is not None
+        return sqlite3.connect(self.db_name, check_same_thread=not timed)
+
+    def _read_conn(self):
+        """Connection for SQL reads (the same one, unless a subclass says otherwise)"""
+        return self.conn
+
+    def _commit(self):
+        """Commit the current change unless we are inside batch()"""
+        if self._batch_depth == 0:
+            self.conn.commit()
+            self._advance_sync()
+
+    def _advance_sync(self):
+        """After our own commit, move the sync position past it if nobody else wrote
+
+        Memory already has our own changes, so refresh() shouldn't read them back.
+        """
+        if self._sync_seq is None:
+            return
+        try:
+            cursor = self.conn.cursor()
+            # Sequence first: if another process commits in between, data_version shows it
+            cursor.execute('SELECT last_seq FROM sync_state')
+            last_seq = cursor.fetchone()[0]
+            cursor.execute('PRAGMA data_version')
+            if cursor.fetchone()[0] != self._data_version:
+                return  # someone else wrote too; refresh() sorts it out
+            rows = ()
+            if not self.loaded and self._counts is not None:
+                # The counters may not show this write yet, so the base
+                # follows the log rather than copying them
+                cursor.execute('''
+                    SELECT old_completed, old_priority, new_completed, new_priority
+                    FROM task_count_changes WHERE seq > ? AND seq <= ?
+                ''', (self._sync_seq, last_seq))
+                rows = cursor.fetchall()
+        except sqlite3.Error:
+            return  # only an optimisation, and the write itself already committed
+        with self._map_lock:
+            self._add_count_changes(self._base_counts, rows)
+            self._sync_seq = last_seq
+
+    def _with_retry(self, write):
+        """Run write() (which commits), retrying with backoff while the database is locked"""
+        # busy_timeout already waits inside SQLite; this covers what it can't,
+        # like a commit that gave up or two connections both upgrading to write
+        delay = RETRY_DELAY
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._conn_lock:
+                    return write()
+            except sqlite3.OperationalError as error:
+                # Inside batch() the transaction isn't ours to roll back and replay
+                if self._batch_depth or attempt == self.max_retries or not _is_busy(error):
+                    raise
+                with self._conn_lock:
+                    if self.conn.in_transaction:
+                        self.conn.rollback()
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+
+    def _write(self, sql, params=()):
+        """Execute one write statement and commit it (with retries); return the cursor"""
+        cursor = self.conn.cursor()
+
+        def write():
+            cursor.execute(sql, params)
+            self._commit()
+
+        self._with_retry(write)
+        return cursor
+
+    def _conflict(self, task_ids):
+        """Catch up with the other writer's changes, then raise TaskConflictError"""
+        self.refresh()
+        raise TaskConflictError(task_ids)
+
+    @contextmanager
+    def batch(self):
+        """Run several operations as one transaction
+
+        Nothing commits until the outermost block ends. If the block raises,
+        the database and the in-memory tasks and counters are rolled back.
+        Nested blocks use savepoints, so an inner failure only undoes the
+        inner block.
+        """
+        # Keep the flush timer out of the transaction until it ends
+        with self._conn_lock:
+            depth = self._batch_depth
+            cursor = self.conn.cursor()
+            if depth == 0:
+                # Queued write-behind changes go in before the batch starts
+                self.flush()
+                # Take the write lock up front: a transaction that starts as a
+                # reader and upgrades later can fail without waiting at all
+                self._with_retry(lambda: cursor.execute('BEGIN IMMEDIATE'))
+            else:
+                cursor.execute(f'SAVEPOINT batch_{depth}')
+            undo_mark = len(self._undo_log)
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if depth == 0:
+                    self.conn.rollback()
+                else:
+                    cursor.execute(f'ROLLBACK TO batch_{depth}')
+                    cursor.execute(f'RELEASE batch_{depth}')
+                self._undo_to(undo_mark)
+                raise
+            self._batch_depth -= 1
+            if depth == 0:
+                try:
+                    self._commit_batch()
+                except BaseException:
+                    # Still failing after the retries: undo it all, or the next
+                    # write would quietly commit this batch along with its own
+                    self.conn.rollback()
+                    self._undo_to(undo_mark)
+                    raise
+                self._undo_log = []
+            else:
+                cursor.execute(f'RELEASE batch_{depth}')
+
+    def _commit_batch(self):
+        """Commit the outermost batch, retrying with backoff while readers block it"""
+        # Unlike _with_retry this keeps the transaction open between attempts;
+        # only the COMMIT is tried again
+        delay = RETRY_DELAY
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.conn.commit()
+            except sqlite3.OperationalError as error:
+                if attempt == self.max_retries or not _is_busy(error):
+                    raise
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                delay *= 2
+            else:
+                self._advance_sync()
+                return
+
+    def _record_undo(self, undo, *args):
+        """Remember how to reverse an in-memory change (only inside batch())"""
+        if self._batch_depth:
+            self._undo_log.append((undo, args))
+
+    def _undo_to(self, mark):
+        """Reverse in-memory changes, newest first, back to an undo log position"""
+        self._undo_unsorted = False
+        while len(self._undo_log) > mark:
+            undo, args = self._undo_log.pop()
+            undo(*args)
+        # Undone deletes go back at the end; put them in id order once, not per task
+        if self._undo_unsorted:
+            with self._map_lock:
+                self._tasks_by_id = dict(sorted(self._tasks_by_id.items()))
+                self._task_list = None
+            self._undo_unsorted = False
+
+    def _undo_add(self, task):
+        with self._map_lock:
+            self._update_counts(task, -1)
+            if self.loaded:
+                del self._tasks_by_id[task.id]
+                self._task_list = None
+        if self.columnar is not None:
+            self.columnar.remove_last(task.id)
+
+    def _undo_delete(self, task):
+        with self._map_lock:
+            self._update_counts(task, 1)
+            if self.loaded:
+                # The map is in id order, so its last key is the largest id
+                if self._tasks_by_id and task.id < next(reversed(self._tasks_by_id)):
+                    self._undo_unsorted = True
+                self._tasks_by_id[task.id] = task
+                self._task_list = None
+        if self.columnar is not None:
+            self.columnar.restore(task.id)
+
+    def _undo_restore(self, task):
+        with self._map_lock:
+            self._update_counts(task, -1)
+            if self.loaded:
+                self._tasks_by_id.pop(task.id, None)
+                self._task_list = None
+
+    def _undo_counts(self, counts):
+        with self._map_lock:
+            self._counts = counts
+
+    def _undo_seed(self):
+        with self._map_lock:
+            self._counts = self._base_counts = None
+
+    def _undo_change(self, task, completed, priority, version):
+        with self._map_lock:
+            self._update_counts(task, -1)
+            task.completed = completed
+            task.priority = priority
+            task.version = version
+            self._update_counts(task, 1)
+        if self.columnar is not None:
+            self.columnar.update_task(task)
+
+    def _check_settings(self):
+        """Validate and normalise self.settings before they go into PRAGMAs"""
+        for name in ['journal_mode', 'synchronous', 'temp_store']:
+            if name == 'journal_mode' and self.settings[name] is None:
+                continue
+            value = str(self.settings[name]).lower()
+            if value not in SETTING_CHOICES[name]:
+                raise ValueError(f"Invalid {name}: {value}")
+            self.settings[name] = value
+        for name in ['cache_size', 'mmap_size', 'busy_timeout']:
+            self.settings[name] = int(self.settings[name])
+
+    def _apply_settings(self):
+        """Run the PRAGMAs for self.settings on the connection"""
+        cursor = self.conn.cursor()
+        # First, so everything after it waits for other processes' locks
+        cursor.execute(f"PRAGMA busy_timeout = {self.settings['busy_timeout']}")
+        for name, value in self.settings.items():
+            if name not in ('busy_timeout', 'journal_mode'):
+                cursor.execute(f'PRAGMA {name} = {value}')
+        # Only switch when the file isn't in the wanted mode already; asking
+        # for the current mode again still takes a lock
+        cursor.execute('PRAGMA journal_mode')
+        self.journal_mode = cursor.fetchone()[0]
+        wanted = self.settings['journal_mode']
+        if wanted is not None and wanted != self.journal_mode:
+            # Needs the file to itself, so other processes opening it can be in the way
+            self._with_retry(lambda: cursor.execute(f'PRAGMA journal_mode = {wanted}'))
+            self.journal_mode = cursor.fetchone()[0]
+
+    @property
+    def tasks(self):
+        """Tasks in display order (rebuilt only after a delete or reload)"""
+        if self.columnar is not None and not self.loaded:
+            # The store caches the list until one of its rows changes
+            return self.columnar.all_tasks()
+        # Loading is deferred until something needs the full list
+        if not self.loaded:
+            self.load_tasks()
+        with self._map_lock:
+            if self._task_list is None:
+                self._task_list = list(self._tasks_by_id.values())
+            return self._task_list
     
     def _init_database(self):
-        """Create the tasks table if it doesn't exist"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        """Create or upgrade the schema, unless PRAGMA user_version says it is current"""
+        # Every copy of a cron job or CLI opens the file at once after an
+        # upgrade is deployed, so this waits its turn like any other write
+        self._with_retry(self._upgrade_schema)
+
+    def _upgrade_schema(self):
+        """Run the upgrade steps the file still needs, in one transaction"""
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] >= SCHEMA_VERSION:
+            return
+
+        # One transaction, so a crash can't leave a half-built schema. Take the
+        # write lock first and look again: another process opening the file
+        # may have upgraded it meanwhile, and ADD COLUMN can't run twice
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('PRAGMA user_version')
+            version = cursor.fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                self.conn.commit()
+                return
+            if version < 1:
+                self._create_schema_v1(cursor)
+            if version < 2:
+                self._upgrade_to_v2(cursor)
+            if version < 3:
+                self._upgrade_to_v3(cursor)
+            if version < 4:
+                self._upgrade_to_v4(cursor)
+            if version < 5:
+                self._upgrade_to_v5(cursor)
+            if version < 6:
+                self._upgrade_to_v6(cursor)
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+    def _create_schema_v1(self, cursor):
+        """Tasks table, grouped-view index and search index"""
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS tasks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -90,65 +657,371 @@ class TaskManager:
                 created_at TEXT NOT NULL
             )
         ''')
-        conn.commit()
-        conn.close()
+        # Serves the grouped view (completed + priority) in created_at order
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_tasks_completed_priority_created
+            ON tasks (completed, priority, created_at)
+        ''')
+        self._init_search_index(cursor)
+
+    def _init_search_index(self, cursor):
+        """Create the FTS5 search table and the triggers that keep it in sync"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")
+        already_exists = cursor.fetchone() is not None
+        try:
+            # External-content table: the text lives in tasks, FTS only keeps the index.
+            # The prefix option pre-indexes 2 and 3 letter prefixes for "gr"* style queries.
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts
+                USING fts5(description, content='tasks', content_rowid='id', prefix='2 3')
+            ''')
+        except sqlite3.OperationalError:
+            # This SQLite was built without FTS5; search() falls back to LIKE
+            return
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+                INSERT INTO tasks_fts (rowid, description) VALUES (new.id, new.description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+                INSERT INTO tasks_fts (tasks_fts, rowid, description) VALUES ('delete', old.id, old.description);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF description ON tasks BEGIN
+                INSERT INTO tasks_fts (tasks_fts, rowid, description) VALUES ('delete', old.id, old.description);
+                INSERT INTO tasks_fts (rowid, description) VALUES (new.id, new.description);
+            END
+        ''')
+        if not already_exists:
+            # Index the tasks that were added before search existed
+            cursor.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+    def _upgrade_to_v2(self, cursor):
+        """Change tracking for refresh(): a change sequence on rows plus delete tombstones"""
+        # Every insert, update and delete takes the next number from sync_state.
+        # Rows remember the number of their last change, deleted ids leave a
+        # tombstone, so "what changed since N?" is two indexed range scans.
+        cursor.execute('ALTER TABLE tasks ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tasks_change_seq ON tasks (change_seq)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sync_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                last_seq INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO sync_state (id, last_seq) VALUES (1, 0)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS task_tombstones (
+                id INTEGER PRIMARY KEY,
+                change_seq INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tombstones_change_seq ON task_tombstones (change_seq)')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_track_insert AFTER INSERT ON tasks BEGIN
+                UPDATE sync_state SET last_seq = last_seq + 1;
+                UPDATE tasks SET change_seq = (SELECT last_seq FROM sync_state) WHERE id = new.id;
+                DELETE FROM task_tombstones WHERE id = new.id;
+            END
+        ''')
+        # Not "OF change_seq", so the UPDATE inside these triggers doesn't fire them again
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_track_update
+            AFTER UPDATE OF description, completed, priority, created_at ON tasks BEGIN
+                UPDATE sync_state SET last_seq = last_seq + 1;
+                UPDATE tasks SET change_seq = (SELECT last_seq FROM sync_state) WHERE id = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_track_delete AFTER DELETE ON tasks BEGIN
+                UPDATE sync_state SET last_seq = last_seq + 1;
+                INSERT OR REPLACE INTO task_tombstones (id, change_seq)
+                VALUES (old.id, (SELECT last_seq FROM sync_state));
+            END
+        ''')
+
+    def _upgrade_to_v3(self, cursor):
+        """Per-row version number, for compare-and-swap updates"""
+        cursor.execute('ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+        # A trigger rather than our UPDATE statements, so writers that don't
+        # know about versions (older copies of this app, the sqlite3 shell)
+        # still bump it and we notice their changes
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_bump_version
+            AFTER UPDATE OF description, completed, priority, created_at ON tasks BEGIN
+                UPDATE tasks SET version = version + 1 WHERE id = new.id;
+            END
+        ''')
+
+    def _upgrade_to_v4(self, cursor):
+        """Completion time on tasks, and the archive table old completed tasks move to"""
+        # Rows completed before this upgrade keep NULL; archiving falls back to created_at
+        cursor.execute('ALTER TABLE tasks ADD COLUMN completed_at TEXT')
+        # Local time like created_at, and a trigger so bulk updates and other writers set it too
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS tasks_set_completed_at
+            AFTER UPDATE OF completed ON tasks WHEN new.completed IS NOT old.completed BEGIN
+                UPDATE tasks SET completed_at = CASE WHEN new.completed
+                    THEN strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime') END
+                WHERE id = new.id;
+            END
+        ''')
+        # Same ids as in tasks (AUTOINCREMENT never hands them out again), so restoring keeps them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archived_tasks (
+                id INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                completed INTEGER DEFAULT 1,
+                priority TEXT DEFAULT 'medium',
+                created_at TEXT NOT NULL,
+                completed_at TEXT NOT NULL,
+                archived_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_archived_completed_at ON archived_tasks (completed_at)')
+
+    def _upgrade_to_v5(self, cursor):
+        """Index on the urgency order, so next_tasks(k) reads k index entries instead of sorting"""
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_tasks_urgency ON tasks (completed, {URGENCY_ORDER}, id)')
+
+    def _upgrade_to_v6(self, cursor):
+        """Counter change log, so refresh() can patch counts without loaded tasks; pruning position"""
+        # Changes with a sequence number at or below pruned_seq may have lost
+        # their tombstones and log rows, so refresh() can't catch up across it
+        cursor.execute('ALTER TABLE sync_state ADD COLUMN pruned_seq INTEGER NOT NULL DEFAULT 0')
+        # One row per change to a task's (completed, priority) bucket: old is NULL
+        # for an insert, new is NULL for a delete. NULL columns in tasks are
+        # logged as the values _count_in_database() counts them as.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS task_count_changes (
+                seq INTEGER PRIMARY KEY,
+                old_completed INTEGER,
+                old_priority TEXT,
+                new_completed INTEGER,
+                new_priority TEXT,
+                changed_at REAL NOT NULL DEFAULT (julianday('now'))
+            )
+        ''')
+        for name in ('tasks_track_insert', 'tasks_track_update', 'tasks_track_delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute('''
+            CREATE TRIGGER tasks_track_insert AFTER INSERT ON tasks BEGIN
+                UPDATE sync_state SET last_seq = last_seq + 1;
+                UPDATE tasks SET change_seq = (SELECT last_seq FROM sync_state) WHERE id = new.id;
+                DELETE FROM task_tombstones WHERE id = new.id;
+                INSERT INTO task_count_changes (seq, new_completed, new_priority)
+                SELECT last_seq, coalesce(new.completed, 0), coalesce(new.priority, 'medium') FROM sync_state;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER tasks_track_update
+            AFTER UPDATE OF description, completed, priority, created_at ON tasks BEGIN
+                UPDATE sync_state SET last_seq = last_seq + 1;
+                UPDATE tasks SET change_seq = (SELECT last_seq FROM sync_state) WHERE id = new.id;
+                INSERT INTO task_count_changes (seq, old_completed, old_priority, new_completed, new_priority)
+                SELECT last_seq, coalesce(old.completed, 0), coalesce(old.priority, 'medium'),
+                       coalesce(new.completed, 0), coalesce(new.priority, 'medium')
+                FROM sync_state
+                WHERE old.completed IS NOT new.completed OR old.priority IS NOT new.priority;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER tasks_track_delete AFTER DELETE ON tasks BEGIN
+                UPDATE sync_state SET last_seq = last_seq + 1;
+                INSERT OR REPLACE INTO task_tombstones (id, change_seq)
+                VALUES (old.id, (SELECT last_seq FROM sync_state));
+                INSERT INTO task_count_changes (seq, old_completed, old_priority)
+                SELECT last_seq, coalesce(old.completed, 0), coalesce(old.priority, 'medium') FROM sync_state;
+            END
+        ''')
+        # The log starts here: earlier positions can't be caught up from it
+        cursor.execute('UPDATE sync_state SET pruned_seq = last_seq')
+
+    def _search_index_available(self):
+        """Check (once) whether the FTS5 search table exists"""
+        if self._has_search_index is None:
+            cursor = self._read_conn().cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts'")
+            self._has_search_index = cursor.fetchone() is not None
+        return self._has_search_index
     
     def add_task(self, description, priority="medium"):
         """Add a new task"""
         task = Task(description, priority=priority)
         
         # Insert into database
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('''
+        cursor = self._write('''
             INSERT INTO tasks (description, completed, priority, created_at)
             VALUES (?, ?, ?, ?)
         ''', (task.description, int(task.completed), task.priority, task.created_at.isoformat()))
         task.id = cursor.lastrowid # Autogeerate ID
-        conn.commit()
-        conn.close()
         
-        self.tasks.append(task)
+        self._added(task)
         return task
-    
+
+    def add_tasks(self, task_data):
+        """Add many (description, priority) tasks in a single transaction"""
+        return self._insert_tasks(Task(description, priority=priority) for description, priority in task_data)
+
+    def _insert_tasks(self, tasks):
+        """Insert new Task objects in a single transaction, giving them ids; return them"""
+        new_tasks = []
+
+        def rows():
+            # Take Task objects as executemany pulls rows, so the input
+            # can be any iterable (even a generator) without copying it first
+            for task in tasks:
+                new_tasks.append(task)
+                yield (task.description, int(task.completed), task.priority, task.created_at.isoformat())
+
+        cursor = self.conn.cursor()
+        with self.batch():
+            cursor.executemany('''
+                INSERT INTO tasks (description, completed, priority, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', rows())
+            cursor.execute('SELECT last_insert_rowid()')
+            last_id = cursor.fetchone()[0]
+
+            # We held the write lock for the whole transaction, so the new ids
+            # are consecutive and end at last_insert_rowid()
+            first_id = last_id - len(new_tasks) + 1
+            for offset, task in enumerate(new_tasks):
+                task.id = first_id + offset
+                self._added(task)
+        return new_tasks
+
+    def _added(self, task):
+        """Update counters, identity map and columnar store for a new task"""
+        with self._map_lock:
+            self._update_counts(task, 1)
+            if self.loaded:
+                self._tasks_by_id[task.id] = task
+                # New ids are always the largest, so the cached list stays in order
+                if self._task_list is not None:
+                    self._task_list.append(task)
+        if self.columnar is not None:
+            self.columnar.append_task(task)
+        self._record_undo(self._undo_add, task)
+
     def get_all_tasks(self):
         """Return all tasks"""
         return self.tasks
     
+    def get_task_count(self):
+        """Return the total number of tasks"""
+        if self.columnar is not None:
+            return len(self.columnar)
+        self._seed_counts()
+        with self._map_lock:
+            return sum(self._counts.values())
+
     def get_task(self, index):
         """Get a task by index (0-based)"""
-        if 0 <= index < len(self.tasks):
-            return self.tasks[index]
+        if self.columnar is not None and not self.loaded:
+            # Find the row without building every Task, then read it like get_task_by_id
+            rows = self.columnar.filter()
+            if 0 <= index < len(rows):
+                return self._fetch_task(self.columnar.ids[rows[index]])
+            return None
+        tasks = self.tasks
+        if 0 <= index < len(tasks):
+            return tasks[index]
         return None
+
+    def get_task_by_id(self, task_id):
+        """Get a task by its database id"""
+        if not self.loaded:
+            return self._fetch_task(task_id)
+        return self._tasks_by_id.get(task_id)
+
+    def _fetch_task(self, task_id):
+        """Read a single task from the database"""
+        cursor = self._read_conn().cursor()
+        if task_id in self._pending_deletes:
+            return None
+        cursor.execute('SELECT id, description, completed, priority, created_at, version FROM tasks WHERE id = ?',
+                       (task_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        task = self._row_to_task(row)
+        # Apply changes that are still waiting to be written
+        changes = self._pending_updates.get(task_id, {})
+        if 'completed' in changes:
+            task.completed = bool(changes['completed'])
+        if 'priority' in changes:
+            task.priority = changes['priority']
+        return task
     
     def delete_task(self, index):
         """Delete a task by index"""
-        if 0 <= index < len(self.tasks):
-            task = self.tasks[index]
-            
+        task = self.get_task(index)
+        if task:
+            return self.delete_task_by_id(task.id)
+        return None
+
+    def delete_task_by_id(self, task_id):
+        """Delete a task by its database id"""
+        task = self.get_task_by_id(task_id)
+        if task:
             # Delete from database
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM tasks WHERE id = ?', (task.id,))
-            conn.commit()
-            conn.close()
-            
-            deleted_task = self.tasks.pop(index)
-            return deleted_task
+            self._delete_row(task)
+
+            with self._map_lock:
+                self._update_counts(task, -1)
+                if self.loaded:
+                    del self._tasks_by_id[task.id]
+                    # Positions after this task shift, so drop the cached list
+                    self._task_list = None
+            if self.columnar is not None:
+                self.columnar.delete(task.id)
+            self._record_undo(self._undo_delete, task)
+            return task
         return None
     
     def mark_task_complete(self, index):
         """Mark a task as complete"""
         task = self.get_task(index)
         if task:
-            task.mark_complete()
-            
-            # Update in database
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('UPDATE tasks SET completed = ? WHERE id = ?', (1, task.id))
-            conn.commit()
-            conn.close()
+            return self.mark_task_complete_by_id(task.id)
+        return False
+
+    def mark_task_complete_by_id(self, task_id):
+        """Mark a task as complete by its database id"""
+        return self._set_task_completed(task_id, True)
+
+    def mark_task_incomplete(self, index):
+        """Mark a task as incomplete"""
+        task = self.get_task(index)
+        if task:
+            return self.mark_task_incomplete_by_id(task.id)
+        return False
+
+    def mark_task_incomplete_by_id(self, task_id):
+        """Mark a task as incomplete by its database id"""
+        return self._set_task_completed(task_id, False)
+
+    def _set_task_completed(self, task_id, completed):
+        """Set a task's completed flag in memory, in the counters and in the database"""
+        task = self.get_task_by_id(task_id)
+        if task:
+            if task.completed != completed:
+                previous = (task.completed, task.priority, task.version)
+                # Database first: if someone else changed the task, nothing here changes
+                self._update_row(task, 'completed', int(completed))
+                self._record_undo(self._undo_change, task, *previous)
+                with self._map_lock:
+                    self._update_counts(task, -1)
+                    if completed:
+                        task.mark_complete()
+                    else:
+                        task.mark_incomplete()
+                    self._update_counts(task, 1)
+                if self.columnar is not None:
+                    self.columnar.update_task(task)
             
             return True
         return False
@@ -156,84 +1029,954 @@ class TaskManager:
     def set_task_priority(self, index, priority):
         """Set priority for a task"""
         task = self.get_task(index)
-        if task and task.set_priority(priority):
-            
-            # Update in database
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            cursor.execute('UPDATE tasks SET priority = ? WHERE id = ?', (task.priority, task.id))
-            conn.commit()
-            conn.close()
-            
-            return True
+        if task:
+            return self.set_task_priority_by_id(task.id, priority)
         return False
 
+    def set_task_priority_by_id(self, task_id, priority):
+        """Set priority for a task by its database id"""
+        task = self.get_task_by_id(task_id)
+        if task is None:
+            return False
+        if not (isinstance(priority, str) and priority.lower() in PRIORITY_CODES):
+            return False
+        priority = priority.lower()
+        if priority != task.priority:
+            previous = (task.completed, task.priority, task.version)
+            # Database first: if someone else changed the task, nothing here changes
+            self._update_row(task, 'priority', priority)
+            self._record_undo(self._undo_change, task, *previous)
+            with self._map_lock:
+                self._update_counts(task, -1)
+                task.set_priority(priority)
+                self._update_counts(task, 1)
+            if self.columnar is not None:
+                self.columnar.update_task(task)
+        return True
+
+    def _update_row(self, task, column, value):
+        """Write one column of one task now, or queue it in write-behind mode
+
+        The write only happens if the row still has the version we read
+        (compare-and-swap); otherwise this raises TaskConflictError.
+        """
+        if self.write_behind and not self._batch_depth:
+            with self._conn_lock:
+                self._pending_versions.setdefault(task.id, task.version)
+                self._pending_updates.setdefault(task.id, {})[column] = value
+                self._queued()
+            return
+        cursor = self._write(f'UPDATE tasks SET {column} = ? WHERE id = ? AND version = ?',
+                             (value, task.id, task.version))
+        if cursor.rowcount == 0:
+            self._conflict([task.id])
+        task.version += 1   # the tasks_bump_version trigger did the same to the row
+
+    def _delete_row(self, task):
+        """Delete one task row now (if nobody changed it since we read it), or queue it"""
+        if self.write_behind and not self._batch_depth:
+            with self._conn_lock:
+                # Pending updates to a deleted task don't matter any more
+                self._pending_updates.pop(task.id, None)
+                self._pending_versions.setdefault(task.id, task.version)
+                self._pending_deletes.add(task.id)
+                self._queued()
+            return
+        cursor = self._write('DELETE FROM tasks WHERE id = ? AND version = ?', (task.id, task.version))
+        if cursor.rowcount == 0:
+            self._conflict([task.id])
+
+    def _queued(self):
+        """Flush if the queue is big enough; start the flush timer for its first change"""
+        pending = len(self._pending_updates) + len(self._pending_deletes)
+        if self.flush_every is not None and pending >= self.flush_every:
+            self.flush()
+        elif self.flush_interval_ms is not None and self._flush_timer is None:
+            self._start_flush_timer()
+
+    def _start_flush_timer(self):
+        """Flush flush_interval_ms from now, even if nothing else happens"""
+        self._flush_timer = threading.Timer(self.flush_interval_ms / 1000, self._flush_due)
+        # Don't keep the interpreter alive for it; atexit flushes instead
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush_due(self):
+        """Timer thread: write the queue"""
+        with self._conn_lock:
+            if self._flush_timer is not threading.current_thread():
+                return  # cancelled, or replaced after a flush, while we waited
+            self._flush_timer = None
+            if self.conn is None:
+                return
+            try:
+                self.flush()
+            except TaskConflictError as error:
+                # Nobody is waiting on this thread, so tell the next flush()
+                self._flush_error = error
+            except sqlite3.OperationalError:
+                # Still locked after the retries; the queue is kept for next time
+                self._start_flush_timer()
+
+    def flush(self):
+        """Write all queued changes in one transaction; return how many tasks were written"""
+        with self._conn_lock:
+            if self._flush_timer is not None and self._flush_timer is not threading.current_thread():
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            error, self._flush_error = self._flush_error, None
+            if not self._pending_updates and not self._pending_deletes:
+                if error is not None:
+                    raise error
+                return 0
+
+            updates = self._pending_updates
+            deletes = self._pending_deletes
+            conflicts = self._with_retry(self._write_pending)
+
+            # Each written update bumped the row's version once
+            if self.loaded:
+                for task_id in updates:
+                    task = self._tasks_by_id.get(task_id)
+                    if task is not None and task_id not in conflicts:
+                        task.version += 1
+            self._pending_updates = {}
+            self._pending_deletes = set()
+            self._pending_versions = {}
+            if error is not None:
+                conflicts |= set(error.task_ids)
+            if conflicts:
+                self._conflict(sorted(conflicts))
+            return len(updates) + len(deletes)
+
+    def _write_pending(self):
+        """Write the queue for flush(); return the ids skipped because someone else changed them"""
+        versions = self._pending_versions
+        skipped = set()
+        cursor = self.conn.cursor()
+        try:
+            while True:
+                # One statement per task whatever columns changed, so each row's version moves once
+                updates = [(changes.get('completed'), changes.get('priority'), task_id, versions[task_id])
+                           for task_id, changes in self._pending_updates.items() if task_id not in skipped]
+                deletes = [(task_id, versions[task_id]) for task_id in self._pending_deletes
+                           if task_id not in skipped]
+                written = 0
+                if updates:
+                    cursor.executemany('''
+                        UPDATE tasks SET completed = coalesce(?, completed), priority = coalesce(?, priority)
+                        WHERE id = ? AND version = ?
+                    ''', updates)
+                    written += cursor.rowcount
+                if deletes:
+                    cursor.executemany('DELETE FROM tasks WHERE id = ? AND version = ?', deletes)
+                    written += cursor.rowcount
+                if written == len(updates) + len(deletes):
+                    break
+                # Someone else changed some of these tasks: start again without them
+                self.conn.rollback()
+                for task_id, version in [row[2:] for row in updates] + deletes:
+                    cursor.execute('SELECT version FROM tasks WHERE id = ?', (task_id,))
+                    row = cursor.fetchone()
+                    if row is None or row[0] != version:
+                        skipped.add(task_id)
+            self._commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return skipped
+
     def get_incomplete_count(self):
         """Return number of incomplete tasks"""
-        return sum(1 for task in self.tasks if not task.completed)
+        if self.columnar is not None:
+            return self.columnar.get_incomplete_count()
+        self._seed_counts()
+        with self._map_lock:
+            return sum(count for (completed, _), count in self._counts.items() if not completed)
     
     def get_completed_count(self):
         """Return number of completed tasks"""
-        return sum(1 for task in self.tasks if task.completed)
+        if self.columnar is not None:
+            return self.columnar.get_completed_count()
+        self._seed_counts()
+        with self._map_lock:
+            return sum(count for (completed, _), count in self._counts.items() if completed)
+
+    def get_priority_counts(self, completed=False):
+        """Return {'high': n, 'medium': n, 'low': n} for incomplete (or completed) tasks"""
+        if self.columnar is not None:
+            counts = self.columnar.count_by_priority(completed)
+            return {priority: counts[priority] for priority in ['high', 'medium', 'low']}
+        self._seed_counts()
+        with self._map_lock:
+            return {priority: self._counts.get((completed, priority), 0)
+                    for priority in ['high', 'medium', 'low']}
+
+    def _update_counts(self, task, delta):
+        """Add delta to the counter for this task's (completed, priority) bucket
+
+        Every change to a task goes -1 (old state), then +1 (new state), so
+        this is also where the next_tasks() queue hears about new states.
+        """
+        if self._counts is not None:
+            key = (task.completed, task.priority)
+            self._counts[key] = self._counts.get(key, 0) + delta
+        if delta > 0 and self._queue is not None and not task.completed:
+            self._queue_push(task)
+
+    def _count_in_database(self):
+        """Count tasks per (completed, priority) with one GROUP BY query"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT completed, priority, COUNT(*) FROM tasks GROUP BY completed, priority')
+        counts = {}
+        for completed, priority, count in cursor.fetchall():
+            # Same normalisation as Task.from_row, so odd priorities count as 'medium'
+            key = (bool(completed), PRIORITIES[PRIORITY_CODES.get(priority, MEDIUM)])
+            counts[key] = counts.get(key, 0) + count
+        return counts
+
+    def check_counts(self, repair=False):
+        """Compare the counters with the database; return True if they match"""
+        self.flush()
+        self._seed_counts()
+        actual = self._count_in_database()
+        with self._map_lock:
+            mine = {key: count for key, count in self._counts.items() if count}
+            if mine == actual:
+                return True
+            if repair:
+                self._counts = actual
+            return False
+
+    def search(self, query, limit=20):
+        """Return up to `limit` tasks matching the query, best matches first"""
+        fts_query = build_search_query(query)
+        if not fts_query:
+            return []
+        self.flush()
+
+        cursor = self._read_conn().cursor()
+        if self._search_index_available():
+            cursor.execute('''
+                SELECT tasks.id, tasks.description, tasks.completed, tasks.priority, tasks.created_at, tasks.version
+                FROM tasks_fts JOIN tasks ON tasks.id = tasks_fts.rowid
+                WHERE tasks_fts MATCH ?
+                ORDER BY tasks_fts.rank
+                LIMIT ?
+            ''', (fts_query, limit))
+        else:
+            cursor.execute('''
+                SELECT id, description, completed, priority, created_at, version FROM tasks
+                WHERE description LIKE ? ORDER BY id LIMIT ?
+            ''', (f"%{query.strip()}%", limit))
+
+        results = []
+        for row in cursor.fetchall():
+            # Hand back the loaded Task object if we have one, so edits stick
+            task = self._tasks_by_id.get(row[0]) if self.loaded else None
+            results.append(task or self._row_to_task(row))
+        return results
+
+    def iter_tasks(self, completed=None, priority=None, order_by='id', batch_size=500):
+        """Yield tasks from the database one batch at a time"""
+        if order_by not in TASK_ORDERINGS:
+            raise ValueError(f"Unknown ordering: {order_by}")
+        # Queued changes must be in the database before we read from it
+        self.flush()
+
+        conditions = []
+        params = []
+        if completed is not None:
+            conditions.append('completed = ?')
+            params.append(int(completed))
+        if priority is not None:
+            conditions.append('priority = ?')
+            params.append(priority)
+
+        query = 'SELECT id, description, completed, priority, created_at, version FROM tasks'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY ' + TASK_ORDERINGS[order_by]
+
+        # Use a separate cursor so callers can run other queries while iterating
+        cursor = self._read_conn().cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield self._row_to_task(row)
+
+    def _row_to_task(self, row):
+        """Build a Task from an (id, description, completed, priority, created_at, version) row"""
+        return Task.from_row(*row)
     
     def load_tasks(self):
         """Load all tasks from database"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, description, completed, priority, created_at FROM tasks')
-        rows = cursor.fetchall()
-        conn.close()
+        # Read the position first: anything that changes during the load has
+        # a later sequence number, so refresh() will pick it up again
+        self.flush()
+        self._data_version, self._sync_seq = self._sync_position()
+        tasks_by_id = {task.id: task for task in self.iter_tasks()}
+        # Count what was loaded, so the counters match the tasks whatever
+        # changed between the last refresh() and this read
+        counts = {}
+        for task in tasks_by_id.values():
+            key = (task.completed, task.priority)
+            counts[key] = counts.get(key, 0) + 1
+        with self._map_lock:
+            self._tasks_by_id = tasks_by_id
+            self._task_list = None
+            self._queue = None
+            self._counts = counts
+            self.loaded = True
         
-        self.tasks = []
-        for row in rows:
-            task = Task(
-                description=row[1],
-                completed=bool(row[2]),
-                created_at=row[4],
-                priority=row[3],
-                task_id=row[0]
-            )
-            self.tasks.append(task)
-        
-        if len(self.tasks) > 0:
-            print(f"📋 Loaded {len(self.tasks)} task(s) from database")
+        if len(tasks_by_id) > 0:
+            print(f"📋 Loaded {len(tasks_by_id)} task(s) from database")
+
+    def _sync_position(self):
+        """Return (PRAGMA data_version, last change sequence number)"""
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA data_version')
+        data_version = cursor.fetchone()[0]
+        cursor.execute('SELECT last_seq FROM sync_state')
+        return data_version, cursor.fetchone()[0]
+
+    def _seed_counts(self):
+        """Fill the counters with one GROUP BY, the first time they are needed"""
+        if self._counts is not None:
+            return
+        # Pending write-behind changes are not in the table yet
+        self.flush()
+        with self._conn_lock:
+            cursor = self.conn.cursor()
+            own_transaction = not self.conn.in_transaction
+            if own_transaction:
+                cursor.execute('BEGIN')
+            try:
+                counts = self._count_in_database()
+                # refresh() adds the log after _sync_seq to the counts as they were
+                # at _sync_seq, so wind those changes back out for the base
+                cursor.execute('''
+                    SELECT old_completed, old_priority, new_completed, new_priority
+                    FROM task_count_changes WHERE seq > ?
+                ''', (self._sync_seq,))
+                rows = cursor.fetchall()
+            finally:
+                if own_transaction:
+                    self.conn.commit()
+        base_counts = dict(counts)
+        self._add_count_changes(base_counts, rows, sign=-1)
+        with self._map_lock:
+            if self._counts is not None:
+                return
+            self._counts = counts
+            self._base_counts = base_counts
+        # Counted inside a batch that may still roll back
+        self._record_undo(self._undo_seed)
+
+    def _resync(self):
+        """Start again from the database: the changes refresh() needed were pruned"""
+        self._data_version, self._sync_seq = self._sync_position()
+        with self._map_lock:
+            seeded = self._counts is not None
+            self._counts = self._base_counts = None
+        if self.loaded:
+            self.load_tasks()
+        if self.columnar is not None:
+            self._reload_columnar()
+        # Only count again if somebody was using the counters
+        return self.get_task_count() if seeded or self.loaded else 0
+
+    def _apply_count_changes(self, rows):
+        """Add task_count_changes rows to the counts at the last sync position"""
+        self._add_count_changes(self._base_counts, rows)
+        # The log includes our own changes too, so this replaces the counts
+        # rather than being added to them
+        with self._map_lock:
+            self._counts = dict(self._base_counts)
+
+    @staticmethod
+    def _add_count_changes(counts, rows, sign=1):
+        """Add (or with sign=-1, take away) task_count_changes rows in a counts dict"""
+        for old_completed, old_priority, new_completed, new_priority in rows:
+            if old_priority is not None:
+                key = (bool(old_completed), PRIORITIES[PRIORITY_CODES.get(old_priority, MEDIUM)])
+                counts[key] = counts.get(key, 0) - sign
+            if new_priority is not None:
+                key = (bool(new_completed), PRIORITIES[PRIORITY_CODES.get(new_priority, MEDIUM)])
+                counts[key] = counts.get(key, 0) + sign
+
+    def _prune_if_due(self):
+        """Prune old change records, at most about once a day"""
+        # The oldest row comes first in seq order, so this reads one row
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT changed_at < julianday('now') - ? FROM task_count_changes ORDER BY seq LIMIT 1",
+                       (CHANGE_RETENTION_DAYS + 1,))
+        row = cursor.fetchone()
+        if row is not None and row[0]:
+            self.prune_changes()
+
+    def prune_changes(self, keep_days=CHANGE_RETENTION_DAYS):
+        """Drop tombstones and counter log rows older than keep_days; return how many log rows went"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT max(seq) FROM task_count_changes WHERE changed_at < julianday('now') - ?",
+                       (keep_days,))
+        horizon = cursor.fetchone()[0]
+        if horizon is None:
+            return 0
+        with self.batch():
+            cursor.execute('DELETE FROM task_count_changes WHERE seq <= ?', (horizon,))
+            pruned = cursor.rowcount
+            cursor.execute('DELETE FROM task_tombstones WHERE change_seq <= ?', (horizon,))
+            cursor.execute('UPDATE sync_state SET pruned_seq = max(pruned_seq, ?)', (horizon,))
+        return pruned
+
+    def refresh(self):
+        """Pull in changes other processes made since we last looked; return how many"""
+        # data_version only moves when another connection commits,
+        # so when nothing happened this is one cheap PRAGMA
+        cursor = self.conn.cursor()
+        cursor.execute('PRAGMA data_version')
+        if cursor.fetchone()[0] == self._data_version:
+            return 0
+        # Inside batch() we hold the write lock, so nobody else can have written
+        if self._batch_depth:
+            return 0
+        self.flush()
+
+        # Read the changes and the new position as one consistent snapshot
+        with self._conn_lock:
+            changed = deleted = count_changes = ()
+            own_transaction = not self.conn.in_transaction
+            if own_transaction:
+                cursor.execute('BEGIN')
+            try:
+                data_version, last_seq = self._sync_position()
+                cursor.execute('SELECT pruned_seq FROM sync_state')
+                behind = self._sync_seq < cursor.fetchone()[0]
+                if not behind and (self.loaded or self.columnar is not None):
+                    cursor.execute('''
+                        SELECT id, description, completed, priority, created_at, version FROM tasks
+                        WHERE change_seq > ? ORDER BY id
+                    ''', (self._sync_seq,))
+                    changed = [self._row_to_task(row) for row in cursor.fetchall()]
+                    cursor.execute('SELECT id FROM task_tombstones WHERE change_seq > ?', (self._sync_seq,))
+                    deleted = [row[0] for row in cursor.fetchall()]
+                if not behind and not self.loaded and self._counts is not None:
+                    # Without Task objects to compare, the counters follow the log
+                    cursor.execute('''
+                        SELECT old_completed, old_priority, new_completed, new_priority
+                        FROM task_count_changes WHERE seq > ?
+                    ''', (self._sync_seq,))
+                    count_changes = cursor.fetchall()
+            finally:
+                if own_transaction:
+                    self.conn.commit()
+
+        if behind:
+            return self._resync()
+        if self.loaded or self.columnar is not None:
+            self._apply_changes(changed, deleted)
+        if not self.loaded and self._counts is not None:
+            self._apply_count_changes(count_changes)
+        self._data_version, self._sync_seq = data_version, last_seq
+        return len(changed) + len(deleted) if changed or deleted else len(count_changes)
+
+    def _apply_changes(self, changed, deleted):
+        """Patch the in-memory tasks and counters with rows read by refresh()"""
+        with self._map_lock:
+            for task_id in deleted:
+                task = self._tasks_by_id.pop(task_id, None) if self.loaded else None
+                if task is not None:
+                    self._update_counts(task, -1)
+                    self._task_list = None
+            out_of_order = False
+            # The map is in id order, so its last key is the largest id
+            newest = next(reversed(self._tasks_by_id), 0) if self.loaded else 0
+            for fresh in changed:
+                task = self._tasks_by_id.get(fresh.id) if self.loaded else None
+                if task is not None:
+                    self._update_counts(task, -1)
+                    task.description = fresh.description
+                    task.completed = fresh.completed
+                    task.priority = fresh.priority
+                    task.version = fresh.version
+                    self._update_counts(task, 1)
+                elif self.loaded:
+                    if fresh.id < newest:
+                        out_of_order = True
+                    newest = max(newest, fresh.id)
+                    self._tasks_by_id[fresh.id] = fresh
+                    self._update_counts(fresh, 1)
+                    self._task_list = None
+            if out_of_order:
+                self._tasks_by_id = dict(sorted(self._tasks_by_id.items()))
+
+        if self.columnar is not None:
+            store = self.columnar
+            for task_id in deleted:
+                store.delete(task_id)
+            for fresh in changed:
+                row = store.row_of(fresh.id)
+                if row is not None and store.description(row) == fresh.description:
+                    store.update_task(fresh)
+                elif row is None and (not len(store.ids) or fresh.id > store.ids[-1]):
+                    store.append_task(fresh)
+                else:
+                    # Descriptions are packed and ids must stay sorted, so an edited
+                    # description or an id below our newest row means a rebuild
+                    self._reload_columnar()
+                    break
+
+    def _reload_columnar(self):
+        """Rebuild the columnar store from the database"""
+        from columnar_store import ColumnarTaskStore
+        self.columnar = ColumnarTaskStore.from_database(self.conn)
+
+    # ----- Bulk operations -----
+    # Each runs as one statement over every matching row. RETURNING tells us
+    # which rows changed, so memory and counters are patched to match.
+    # Queued write-behind changes are flushed first, so they can't conflict
+    # with the version bumps the statement makes.
+
+    def complete_where(self, ids=None, priority=None, older_than=None):
+        """Mark every matching incomplete task complete in one UPDATE; return how many changed"""
+        self.flush()
+        where, params = self._where(ids, priority, None, older_than)
+        with self.batch():
+            cursor = self.conn.cursor()
+            cursor.execute(f'UPDATE tasks SET completed = 1 WHERE completed = 0 AND {where} RETURNING id, priority',
+                           params)
+            rows = cursor.fetchall()
+            self._bulk_changed(rows, completed=True)
+        return len(rows)
+
+    def set_priority_where(self, new_priority, ids=None, priority=None, completed=None, older_than=None):
+        """Give every matching task new_priority in one UPDATE; return how many changed"""
+        if new_priority not in PRIORITY_CODES:
+            raise ValueError(f"Unknown priority: {new_priority}")
+        self.flush()
+        where, params = self._where(ids, priority, completed, older_than)
+        with self.batch():
+            cursor = self.conn.cursor()
+            cursor.execute(f'UPDATE tasks SET priority = ? WHERE priority != ? AND {where} RETURNING id, priority',
+                           [new_priority, new_priority] + params)
+            rows = cursor.fetchall()
+            self._bulk_changed(rows, priority=new_priority)
+        return len(rows)
+
+    def delete_where(self, ids=None, priority=None, completed=None, older_than=None):
+        """Delete every matching task in one DELETE; return how many were deleted"""
+        self.flush()
+        where, params = self._where(ids, priority, completed, older_than)
+        with self.batch():
+            cursor = self.conn.cursor()
+            cursor.execute(f'DELETE FROM tasks WHERE {where} RETURNING id, completed, priority', params)
+            rows = cursor.fetchall()
+            self._bulk_deleted(rows)
+        return len(rows)
+
+    def missing_ids(self, ids):
+        """Return the ids, in order, that have no task (deleted, archived or never there)"""
+        self.flush()
+        cursor = self._read_conn().cursor()
+        cursor.execute('SELECT value FROM json_each(?) WHERE value NOT IN (SELECT id FROM tasks) ORDER BY value',
+                       ('[' + ','.join(str(int(task_id)) for task_id in ids) + ']',))
+        return [row[0] for row in cursor.fetchall()]
+
+    def _where(self, ids=None, priority=None, completed=None, older_than=None):
+        """WHERE clause and parameters for the bulk operations' filters"""
+        conditions = []
+        params = []
+        if ids is not None:
+            # One JSON array parameter instead of a placeholder per id, so
+            # any number of ids fits in a single statement
+            conditions.append('id IN (SELECT value FROM json_each(?))')
+            params.append('[' + ','.join(str(int(task_id)) for task_id in ids) + ']')
+        if priority is not None:
+            if priority not in PRIORITY_CODES:
+                raise ValueError(f"Unknown priority: {priority}")
+            conditions.append('priority = ?')
+            params.append(priority)
+        if completed is not None:
+            conditions.append('completed = ?')
+            params.append(int(completed))
+        if older_than is not None:
+            conditions.append('created_at < ?')
+            params.append(_cutoff(older_than))
+        if not conditions:
+            # Refuse rather than quietly change every task
+            raise ValueError("Give ids or at least one filter")
+        return ' AND '.join(conditions), params
+
+    def _bulk_changed(self, rows, completed=None, priority=None):
+        """Patch memory after an UPDATE ... RETURNING id, priority (priority after the update)"""
+        with self._map_lock:
+            if self.loaded:
+                for task_id, _ in rows:
+                    task = self._tasks_by_id.get(task_id)
+                    if task is None:
+                        continue
+                    self._record_undo(self._undo_change, task, task.completed, task.priority, task.version)
+                    self._update_counts(task, -1)
+                    if completed is not None:
+                        task.completed = completed
+                    if priority is not None:
+                        task.priority = priority
+                    task.version += 1   # tasks_bump_version did the same to the row
+                    self._update_counts(task, 1)
+            elif rows and self._counts is not None:
+                self._record_undo(self._undo_counts, dict(self._counts))
+                if priority is None:
+                    # complete_where: every row went from incomplete to complete
+                    for _, row_priority in rows:
+                        key = PRIORITIES[PRIORITY_CODES.get(row_priority, MEDIUM)]
+                        self._counts[(False, key)] = self._counts.get((False, key), 0) - 1
+                        self._counts[(True, key)] = self._counts.get((True, key), 0) + 1
+                else:
+                    # RETURNING only shows the new priority, so count again
+                    self._counts = self._count_in_database()
+        if self.columnar is not None and rows:
+            self._record_undo(self._reload_columnar)
+            for task_id, _ in rows:
+                self.columnar.update(task_id, completed=completed, priority=priority)
+
+    def _bulk_deleted(self, rows):
+        """Patch memory after a DELETE ... RETURNING id, completed, priority"""
+        with self._map_lock:
+            if not self.loaded and rows and self._counts is not None:
+                self._record_undo(self._undo_counts, dict(self._counts))
+            for task_id, completed, row_priority in rows:
+                task = self._tasks_by_id.pop(task_id, None) if self.loaded else None
+                if task is not None:
+                    self._record_undo(self._undo_delete, task)
+                    self._update_counts(task, -1)
+                elif not self.loaded and self._counts is not None:
+                    key = (bool(completed), PRIORITIES[PRIORITY_CODES.get(row_priority, MEDIUM)])
+                    self._counts[key] = self._counts.get(key, 0) - 1
+            if rows:
+                self._task_list = None
+        if self.columnar is not None and rows:
+            self._record_undo(self._reload_columnar)
+            for task_id, _, _ in rows:
+                self.columnar.delete(task_id)
+
+    # ----- Archive -----
+    # Old completed tasks move to archived_tasks, so loading, counting and the
+    # view only ever deal with the active set. The archive has its own queries.
+
+    def archive_completed(self, older_than=ARCHIVE_AFTER_DAYS):
+        """Move tasks completed more than `older_than` (days, timedelta or datetime) ago to the archive
+
+        Returns how many were moved. Copy and delete are two set-based
+        statements in one transaction.
+        """
+        cutoff = _cutoff(older_than)
+        archived_at = datetime.now().isoformat()
+        with self.batch():
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT INTO archived_tasks (id, description, completed, priority, created_at, completed_at, archived_at)
+                SELECT id, description, completed, priority, created_at, coalesce(completed_at, created_at), ?
+                FROM tasks WHERE completed = 1 AND coalesce(completed_at, created_at) < ?
+            ''', (archived_at, cutoff))
+            cursor.execute('''
+                DELETE FROM tasks WHERE completed = 1 AND coalesce(completed_at, created_at) < ?
+                RETURNING id, completed, priority
+            ''', (cutoff,))
+            rows = cursor.fetchall()
+            self._bulk_deleted(rows)
+        return len(rows)
+
+    def restore_archived(self, ids):
+        """Move archived tasks back into the task list, keeping their ids; return the restored tasks"""
+        id_list = '[' + ','.join(str(int(task_id)) for task_id in ids) + ']'
+        with self.batch():
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                INSERT INTO tasks (id, description, completed, priority, created_at, completed_at)
+                SELECT id, description, completed, priority, created_at, completed_at
+                FROM archived_tasks WHERE id IN (SELECT value FROM json_each(?))
+                RETURNING id, description, completed, priority, created_at, version
+            ''', (id_list,))
+            restored = [self._row_to_task(row) for row in cursor.fetchall()]
+            cursor.execute('DELETE FROM archived_tasks WHERE id IN (SELECT value FROM json_each(?))', (id_list,))
+            self._restored(restored)
+        return restored
+
+    def _restored(self, tasks):
+        """Put restored tasks into the counters and memory (their ids are below the newest)"""
+        if not tasks:
+            return
+        with self._map_lock:
+            for task in tasks:
+                self._update_counts(task, 1)
+                self._record_undo(self._undo_restore, task)
+            if self.loaded:
+                self._tasks_by_id.update((task.id, task) for task in tasks)
+                self._tasks_by_id = dict(sorted(self._tasks_by_id.items()))
+                self._task_list = None
+        if self.columnar is not None:
+            self._record_undo(self._reload_columnar)
+            self._reload_columnar()
+
+    def get_archived_tasks(self, query=None, limit=None):
+        """Return archived tasks, most recently completed first, optionally only those matching query"""
+        sql = 'SELECT id, description, completed, priority, created_at FROM archived_tasks'
+        params = []
+        if query:
+            # The archive has no search index; it is read rarely enough for LIKE
+            sql += ' WHERE description LIKE ?'
+            params.append(f"%{query.strip()}%")
+        sql += ' ORDER BY completed_at DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        cursor = self._read_conn().cursor()
+        cursor.execute(sql, params)
+        return [self._row_to_task(row) for row in cursor.fetchall()]
+
+    def get_archived_count(self):
+        """Return the number of archived tasks"""
+        cursor = self._read_conn().cursor()
+        cursor.execute('SELECT COUNT(*) FROM archived_tasks')
+        return cursor.fetchone()[0]
+
+    # ----- Next tasks -----
+
+    def next_tasks(self, k=5):
+        """Return the k incomplete tasks to do next, most urgent first
+
+        Urgency is priority plus time waited (see URGENCY_DAYS_PER_PRIORITY).
+        With tasks loaded this pops k tasks off a heap and pushes them back,
+        O(k log n); otherwise it reads the first k rows of idx_tasks_urgency.
+        """
+        if not self.loaded:
+            return self._next_tasks_in_database(k)
+        with self._map_lock:
+            if self._queue is None:
+                self._queue = [(task.urgency_key(), task.id, task._priority_code)
+                               for task in self._tasks_by_id.values() if not task.completed]
+                heapq.heapify(self._queue)
+            found = []
+            seen = set()
+            while self._queue and len(found) < k:
+                entry = heapq.heappop(self._queue)
+                task = self._tasks_by_id.get(entry[1])
+                # Stale: deleted, completed, reprioritised, or a second entry for the same state
+                if task is None or task.completed or task._priority_code != entry[2] or entry[1] in seen:
+                    continue
+                seen.add(entry[1])
+                found.append(entry)
+            for entry in found:
+                heapq.heappush(self._queue, entry)
+            return [self._tasks_by_id[entry[1]] for entry in found]
+
+    def _queue_push(self, task):
+        """Add a task's current state to the next_tasks() heap"""
+        heapq.heappush(self._queue, (task.urgency_key(), task.id, task._priority_code))
+        # Mostly stale entries by now: drop the heap, next_tasks() rebuilds it
+        if len(self._queue) > 2 * len(self._tasks_by_id) + 100:
+            self._queue = None
+
+    def _next_tasks_in_database(self, k):
+        """next_tasks() without loaded tasks: the first k incomplete rows in urgency order"""
+        self.flush()
+        cursor = self._read_conn().cursor()
+        cursor.execute(f'''
+            SELECT id, description, completed, priority, created_at, version FROM tasks
+            WHERE completed = 0 ORDER BY {URGENCY_ORDER}, id LIMIT ?
+        ''', (k,))
+        return [self._row_to_task(row) for row in cursor.fetchall()]
+
+    def import_json(self, source, batch_size=IMPORT_BATCH_SIZE):
+        """Add the tasks from a JSON array file (like the old tasks.json); return how many"""
+        from task_io import iter_json_array
+        return self._import(source, iter_json_array, batch_size)
+
+    def import_ndjson(self, source, batch_size=IMPORT_BATCH_SIZE):
+        """Add the tasks from a file with one JSON record per line; return how many"""
+        from task_io import iter_ndjson
+        return self._import(source, iter_ndjson, batch_size)
+
+    def import_csv(self, source, batch_size=IMPORT_BATCH_SIZE):
+        """Add the tasks from a CSV file with a header row; return how many"""
+        from task_io import iter_csv
+        return self._import(source, iter_csv, batch_size)
+
+    def _import(self, source, read, batch_size):
+        """Insert the records read(file) yields, batch_size per transaction
+
+        Records are streamed, so memory use doesn't grow with the file. Each
+        batch commits on its own: if a record is bad, the batches before it
+        stay imported. Imported tasks get new ids.
+        """
+        from task_io import open_text, task_from_record
+
+        count = 0
+        with open_text(source, 'r') as file:
+            records = read(file)
+            while True:
+                chunk = list(islice(records, batch_size))
+                if not chunk:
+                    break
+                self._insert_tasks(task_from_record(record) for record in chunk)
+                count += len(chunk)
+        return count
+
+    def export_json(self, destination):
+        """Write every task to a JSON array file (the tasks.json layout, plus ids); return how many"""
+        from task_io import write_json_array
+        return self._export(destination, write_json_array)
+
+    def export_ndjson(self, destination):
+        """Write every task as one JSON record per line; return how many"""
+        from task_io import write_ndjson
+        return self._export(destination, write_ndjson)
+
+    def export_csv(self, destination):
+        """Write every task to a CSV file with a header row; return how many"""
+        from task_io import write_csv
+        return self._export(destination, write_csv)
+
+    def _export(self, destination, write):
+        """Stream every task, in id order, through write(file, records)"""
+        from task_io import export_record, open_text
+
+        with open_text(destination, 'w') as file:
+            return write(file, (export_record(task) for task in self.iter_tasks(batch_size=IMPORT_BATCH_SIZE)))
 
     def get_tasks_by_priority(self):
         """Return tasks grouped by priority"""
-        high = [t for t in self.tasks if t.priority == 'high' and not t.completed]
-        medium = [t for t in self.tasks if t.priority == 'medium' and not t.completed]
-        low = [t for t in self.tasks if t.priority == 'low' and not t.completed]
-        completed = [t for t in self.tasks if t.completed]
+        if self.columnar is not None:
+            return self.columnar.get_tasks_by_priority()
+        if not self.loaded:
+            return self._get_tasks_by_priority_sql()
+
+        # One pass over the loaded tasks instead of one pass per group
+        groups = {'high': [], 'medium': [], 'low': []}
+        completed = []
+        with self._map_lock:
+            for task in self._tasks_by_id.values():
+                if task.completed:
+                    completed.append(task)
+                else:
+                    groups[task.priority].append(task)
+        return groups['high'], groups['medium'], groups['low'], completed
+
+    def _get_tasks_by_priority_sql(self):
+        """Read each priority group with its own indexed query"""
+        # Each query is a range scan on idx_tasks_completed_priority_created,
+        # so it only touches the rows that end up in that group
+        high = list(self.iter_tasks(completed=False, priority='high', order_by='created_at'))
+        medium = list(self.iter_tasks(completed=False, priority='medium', order_by='created_at'))
+        low = list(self.iter_tasks(completed=False, priority='low', order_by='created_at'))
+        completed = list(self.iter_tasks(completed=True, order_by='created_at'))
         return high, medium, low, completed
 
+# ===== SELECTIONS =====
+# Largest selection parse_selection() will expand, so "1-999999999" fails fast
+MAX_SELECTION = 1000000
+
+def parse_selection(text):
+    """Turn a selection like "1-50,72,90-95" into a sorted list of unique numbers"""
+    numbers = set()
+    for part in text.replace(' ', '').split(','):
+        if not part:
+            continue
+        start, dash, end = part.partition('-')
+        try:
+            first = int(start)
+            last = int(end) if dash else first
+        except ValueError:
+            raise ValueError(f"Not a number or range: {part}") from None
+        if first < 1 or last < first:
+            raise ValueError(f"Not a valid range: {part}")
+        if len(numbers) + (last - first + 1) > MAX_SELECTION:
+            raise ValueError(f"Selection is larger than {MAX_SELECTION:,} numbers")
+        numbers.update(range(first, last + 1))
+    if not numbers:
+        raise ValueError("Nothing selected")
+    return sorted(numbers)
+
+def missing_positions(manager, tasks, positions):
+    """Return the selected list numbers (as "3, 7") whose tasks have gone since the list was shown"""
+    missing = set(manager.missing_ids([tasks[p - 1].id for p in positions]))
+    return ', '.join(str(p) for p in positions if tasks[p - 1].id in missing)
+
+# ===== DISPLAY =====
+# Sections of the "View Tasks" screen, in display order
+VIEW_SECTIONS = [
+    ('high', "🔴 HIGH PRIORITY:"),
+    ('medium', "🟡 MEDIUM PRIORITY:"),
+    ('low', "🟢 LOW PRIORITY:"),
+    ('completed', "✅ COMPLETED:"),
+]
+
+def render_task_view(tasks):
+    """Build the whole "View Tasks" screen as one string"""
+    # Sort every task into its section in a single pass,
+    # keeping its position in the full list as its number
+    sections = {key: [] for key, _ in VIEW_SECTIONS}
+    for i, task in enumerate(tasks, 1):
+        key = 'completed' if task.completed else task.priority
+        sections[key].append(f"  {i}. {task}")
+
+    lines = ["", "-"*40, "           YOUR TASKS", "-"*40]
+    if len(tasks) == 0:
+        lines.append("No tasks yet. Add one to get started!")
+    else:
+        for key, heading in VIEW_SECTIONS:
+            if sections[key]:
+                lines.append("")
+                lines.append(heading)
+                lines.extend(sections[key])
+    lines.append("-"*40)
+    return "\n".join(lines) + "\n"
+
 # ===== MAIN PROGRAM =====
 def main():
     """Main program loop"""
     
-    # Create a TaskManager object
-    manager = TaskManager()
+    # Create a TaskManager object. Tasks are only loaded once a menu
+    # option needs the full list; the header just uses the counters.
+    # TASK_MANAGER_STATS=- (or a .json file name) reports timings on exit.
+    # TASK_MANAGER_ARCHIVE_DAYS=N archives tasks completed over N days ago.
+    stats = os.environ.get('TASK_MANAGER_STATS')
+    archive_days = os.environ.get('TASK_MANAGER_ARCHIVE_DAYS')
+    manager = TaskManager(load=False, instrument=bool(stats),
+                          auto_archive_days=float(archive_days) if archive_days else None)
     
     # Main loop
     while True:
+        # Catch up with changes made by other task_manager.py processes
+        manager.refresh()
+
         # Display the menu
         print("\n" + "="*30)
         print("      TASK MANAGER")
         print("="*30)
-        print(f"You have {len(manager.tasks)} task(s)")
+        print(f"You have {manager.get_task_count()} task(s)")
         incomplete = manager.get_incomplete_count()
         completed = manager.get_completed_count()
         print(f"{incomplete} incomplete | {completed} completed")
+        if incomplete:
+            # One indexed row (or a heap peek once tasks are loaded)
+            print(f"👉 Next: {manager.next_tasks(1)[0].description}")
         print("="*30)
         print("1. Add Task")
         print("2. View Tasks")
         print("3. Mark Task Complete")
         print("4. Change Task Priority")
         print("5. Delete Task")
-        print("6. Exit")
+        print("6. Search Tasks")
+        print("7. Exit")
         print("="*30)
         
         # Get user's choice
-        choice = input("Enter your choice (1-5): ")
+        choice = input("Enter your choice (1-7): ")
         
         # Handle the choice
         if choice == "1":
@@ -253,45 +1996,12 @@ def main():
 
             
         elif choice == "2":
-            # View all tasks
-            print("\n" + "-"*40)
-            print("           YOUR TASKS")
-            print("-"*40)
-            
-            tasks = manager.get_all_tasks()
-            if len(tasks) == 0:
-                print("No tasks yet. Add one to get started!")
-            else:
-                high, medium, low, completed = manager.get_tasks_by_priority()
-                
-                if high:
-                    print("\n🔴 HIGH PRIORITY:")
-                    for i, task in enumerate(tasks, 1):
-                        if task in high:
-                            print(f"  {i}. {task}")
-                
-                if medium:
-                    print("\n🟡 MEDIUM PRIORITY:")
-                    for i, task in enumerate(tasks, 1):
-                        if task in medium:
-                            print(f"  {i}. {task}")
-                
-                if low:
-                    print("\n🟢 LOW PRIORITY:")
-                    for i, task in enumerate(tasks, 1):
-                        if task in low:
-                            print(f"  {i}. {task}")
-                
-                if completed:
-                    print("\n✅ COMPLETED:")
-                    for i, task in enumerate(tasks, 1):
-                        if task.completed:
-                            print(f"  {i}. {task}")
-            print("-"*40)
+            # View all tasks (built in one pass, written in one go)
+            sys.stdout.write(render_task_view(manager.get_all_tasks()))
 
             
         elif choice == "3":
-            # Mark task complete
+            # Mark task(s) complete
             tasks = manager.get_all_tasks()
             if len(tasks) == 0:
                 print("No tasks to mark complete!")
@@ -301,16 +2011,29 @@ def main():
                 for i, task in enumerate(tasks, 1):
                     print(f"{i}. {task}")
                 
-                # Ask which one to mark complete
-                task_num = input("\nEnter task number to mark complete: ")
+                # Ask which ones to mark complete
+                task_num = input("\nEnter task number(s) to mark complete (e.g. 3 or 1-5,8): ")
                 try:
-                    task_index = int(task_num) - 1
-                    if manager.mark_task_complete(task_index):
-                        print("✓ Task marked as complete!")
-                    else:
+                    positions = parse_selection(task_num)
+                    if len(positions) == 1:
+                        if manager.mark_task_complete(positions[0] - 1):
+                            print("✓ Task marked as complete!")
+                        else:
+                            print("❌ Invalid task number!")
+                    elif positions[-1] > len(tasks):
                         print("❌ Invalid task number!")
+                    else:
+                        # All of them in one statement
+                        with manager.batch():
+                            gone = missing_positions(manager, tasks, positions)
+                            count = manager.complete_where(ids=[tasks[p - 1].id for p in positions])
+                        print(f"✓ {count} task(s) marked as complete!")
+                        if gone:
+                            print(f"❌ Task(s) {gone} no longer exist!")
                 except ValueError:
                     print("❌ Please enter a valid number!")
+                except TaskConflictError as error:
+                    print(f"⚠️  {error}")
                     
         elif choice == "4":
             # Change task priority
@@ -323,12 +2046,11 @@ def main():
                 for i, task in enumerate(tasks, 1):
                     print(f"{i}. {task}")
                 
-                # Ask which one to change
-                task_num = input("\nEnter task number: ")
+                # Ask which ones to change
+                task_num = input("\nEnter task number(s) (e.g. 3 or 1-5,8): ")
                 try:
-                    task_index = int(task_num) - 1
-                    task = manager.get_task(task_index)
-                    if task:
+                    positions = parse_selection(task_num)
+                    if positions[-1] <= len(tasks):
                         print("\nNew priority:")
                         print("  1. Low 🟢")
                         print("  2. Medium 🟡")
@@ -336,19 +2058,29 @@ def main():
                         priority_choice = input("Choose priority (1-3): ").strip()
                         
                         priority_map = {'1': 'low', '2': 'medium', '3': 'high'}
-                        if priority_choice in priority_map:
-                            manager.set_task_priority(task_index, priority_map[priority_choice])
+                        if priority_choice not in priority_map:
+                            print("❌ Invalid priority choice!")
+                        elif len(positions) == 1:
+                            manager.set_task_priority(positions[0] - 1, priority_map[priority_choice])
                             print("✓ Priority updated!")
                         else:
-                            print("❌ Invalid priority choice!")
+                            with manager.batch():
+                                gone = missing_positions(manager, tasks, positions)
+                                count = manager.set_priority_where(priority_map[priority_choice],
+                                                                   ids=[tasks[p - 1].id for p in positions])
+                            print(f"✓ Priority updated for {count} task(s)!")
+                            if gone:
+                                print(f"❌ Task(s) {gone} no longer exist!")
                     else:
                         print("❌ Invalid task number!")
                 except ValueError:
                     print("❌ Please enter a valid number!")
+                except TaskConflictError as error:
+                    print(f"⚠️  {error}")
 
         
         elif choice == "5":
-            # Delete task
+            # Delete task(s)
             tasks = manager.get_all_tasks()
             if len(tasks) == 0:
                 print("No tasks to delete!")
@@ -358,28 +2090,357 @@ def main():
                 for i, task in enumerate(tasks, 1):
                     print(f"{i}. {task}")
                 
-                # Ask which one to delete
-                task_num = input("\nEnter task number to delete: ")
+                # Ask which ones to delete
+                task_num = input("\nEnter task number(s) to delete (e.g. 3 or 1-5,8): ")
                 try:
-                    task_index = int(task_num) - 1
-                    deleted = manager.delete_task(task_index)
-                    if deleted:
-                        print(f"✓ Deleted: {deleted.description}")
-                    else:
+                    positions = parse_selection(task_num)
+                    if len(positions) == 1:
+                        deleted = manager.delete_task(positions[0] - 1)
+                        if deleted:
+                            print(f"✓ Deleted: {deleted.description}")
+                        else:
+                            print("❌ Invalid task number!")
+                    elif positions[-1] > len(tasks):
                         print("❌ Invalid task number!")
+                    else:
+                        with manager.batch():
+                            gone = missing_positions(manager, tasks, positions)
+                            count = manager.delete_where(ids=[tasks[p - 1].id for p in positions])
+                        print(f"✓ Deleted {count} task(s)")
+                        if gone:
+                            print(f"❌ Task(s) {gone} no longer exist!")
                 except ValueError:
                     print("❌ Please enter a valid number!")
+                except TaskConflictError as error:
+                    print(f"⚠️  {error}")
             
         elif choice == "6":
+            # Search tasks
+            query = input("Search for: ").strip()
+            if not query:
+                print("❌ Please enter something to search for!")
+            else:
+                results = manager.search(query)
+                if len(results) == 0:
+                    print("No matching tasks.")
+                else:
+                    print("\n--- Search Results ---")
+                    for task in results:
+                        print(f"#{task.id} {task}")
+            
+        elif choice == "7":
             # Exit
             print("Goodbye! Stay productive!")
             break
             
         else:
             # Invalid choice
-            print("❌ Invalid choice. Please enter 1-6.")
+            print("❌ Invalid choice. Please enter 1-7.")
+    
+    # Close the database connection
+    manager.close()
+    if stats:
+        manager.instrumentation.write(stats)
+
+
+# ===== COMMAND-LINE INTERFACE =====
+# Import/export formats; the CLI picks one from the file extension
+FILE_FORMATS = ('json', 'ndjson', 'csv')
+FORMAT_EXTENSIONS = {'.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv'}
+
+
+def file_format(path, chosen=None):
+    """The import/export format for a file: the one asked for, or from its extension"""
+    if chosen:
+        return chosen
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'json')
+
+def build_parser():
+    """Build the argument parser for the non-interactive commands"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='task_manager.py',
+        description="Manage tasks from the command line. Run with no arguments for the interactive menu.")
+    parser.add_argument('--db', default='tasks.db', help="database file (default: tasks.db)")
+    parser.add_argument('--profile', choices=sorted(DB_PROFILES), default='safe',
+                        help="SQLite durability/speed settings (default: safe)")
+    parser.add_argument('--busy-timeout', type=int, metavar='MS',
+                        help="how long to wait for another process's lock (default: 5000)")
+    parser.add_argument('--stats', action='store_const', const='-', default=os.environ.get('TASK_MANAGER_STATS'),
+                        help="print call and SQL timings to stderr when done")
+    parser.add_argument('--stats-json', dest='stats', metavar='FILE', help="write the timings to FILE as JSON")
+    parser.add_argument('--cprofile', metavar='FILE', default=os.environ.get('TASK_MANAGER_CPROFILE'),
+                        help="run under cProfile and save the profile to FILE")
+    parser.add_argument('--archive-days', type=float, metavar='DAYS',
+                        default=os.environ.get('TASK_MANAGER_ARCHIVE_DAYS'),
+                        help="on start, archive tasks completed more than DAYS ago")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="run one command per line from FILE ('-' for stdin) in a single transaction")
+    commands = parser.add_subparsers(dest='command')
+
+    add = commands.add_parser('add', help="add a task")
+    add.add_argument('description')
+    add.add_argument('-p', '--priority', choices=PRIORITIES, default='medium')
+
+    list_cmd = commands.add_parser('list', help="list tasks")
+    status = list_cmd.add_mutually_exclusive_group()
+    status.add_argument('--done', dest='completed', action='store_const', const=True, help="only completed tasks")
+    status.add_argument('--pending', dest='completed', action='store_const', const=False, help="only incomplete tasks")
+    list_cmd.add_argument('-p', '--priority', choices=PRIORITIES)
+    list_cmd.add_argument('--sort', choices=sorted(TASK_ORDERINGS), default='id')
+    list_cmd.add_argument('-n', '--limit', type=int)
+
+    # Ids can be lists and ranges ("1-50,72"); several ids or a filter run as one statement
+    def selection(text):
+        try:
+            return parse_selection(text)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(str(error)) from None
+
+    done = commands.add_parser('done', help="mark tasks complete")
+    done.add_argument('ids', type=selection, nargs='*', metavar='IDS')
+    done.add_argument('-p', '--priority', choices=PRIORITIES, help="only tasks with this priority")
+    done.add_argument('--older-than', type=float, metavar='DAYS', help="only tasks created more than DAYS ago")
+
+    rm = commands.add_parser('rm', help="delete tasks")
+    rm.add_argument('ids', type=selection, nargs='*', metavar='IDS')
+    rm.add_argument('-p', '--priority', choices=PRIORITIES, help="only tasks with this priority")
+    rm.add_argument('--done', dest='completed', action='store_const', const=True, help="only completed tasks")
+    rm.add_argument('--older-than', type=float, metavar='DAYS', help="only tasks created more than DAYS ago")
+
+    priority = commands.add_parser('priority', help="change tasks' priority")
+    priority.add_argument('ids', type=selection, metavar='IDS')
+    priority.add_argument('priority', choices=PRIORITIES)
+
+    commands.add_parser('stats', help="show task counts")
+
+    next_cmd = commands.add_parser('next', help="show the tasks to do next (priority, then time waited)")
+    next_cmd.add_argument('-n', '--limit', type=int, default=5)
+
+    archive = commands.add_parser('archive', help="move old completed tasks to the archive")
+    archive.add_argument('--older-than', type=float, metavar='DAYS', default=ARCHIVE_AFTER_DAYS,
+                         help=f"completed more than DAYS ago (default: {ARCHIVE_AFTER_DAYS})")
+
+    archived = commands.add_parser('archived', help="list archived tasks, most recently completed first")
+    archived.add_argument('query', nargs='?', help="only tasks whose description contains this")
+    archived.add_argument('-n', '--limit', type=int)
+
+    restore = commands.add_parser('restore', help="move archived tasks back")
+    restore.add_argument('ids', type=selection, nargs='+', metavar='IDS')
+
+    search = commands.add_parser('search', help="search task descriptions")
+    search.add_argument('query')
+    search.add_argument('-n', '--limit', type=int, default=20)
+
+    import_cmd = commands.add_parser('import', help="add tasks from a JSON, NDJSON or CSV file (e.g. the old tasks.json)")
+    import_cmd.add_argument('file')
+    import_cmd.add_argument('--format', choices=FILE_FORMATS, help="default: from the file extension")
+
+    export = commands.add_parser('export', help="write all tasks to a JSON, NDJSON or CSV file")
+    export.add_argument('file')
+    export.add_argument('--format', choices=FILE_FORMATS, help="default: from the file extension")
+
+    return parser
+
+
+def run_command(manager, args, out=sys.stdout):
+    """Run one parsed command; return True if it succeeded"""
+    if args.command == 'add':
+        task = manager.add_task(args.description, args.priority)
+        out.write(f"✓ Added #{task.id}: {task}\n")
+        return True
+
+    if args.command == 'list':
+        tasks = manager.iter_tasks(completed=args.completed, priority=args.priority, order_by=args.sort)
+        for shown, task in enumerate(tasks):
+            if args.limit is not None and shown >= args.limit:
+                break
+            out.write(f"#{task.id} {task}\n")
+        return True
+
+    if args.command in ('done', 'rm'):
+        ids = [task_id for selection in args.ids for task_id in selection]
+        filters = {'priority': args.priority, 'older_than': args.older_than}
+        if args.command == 'rm':
+            filters['completed'] = args.completed
+        if len(ids) != 1 or any(value is not None for value in filters.values()):
+            return run_bulk_command(manager, args, ids, filters, out)
+
+        ok = True
+        for task_id in ids:
+            try:
+                if args.command == 'done':
+                    found = manager.mark_task_complete_by_id(task_id)
+                else:
+                    found = manager.delete_task_by_id(task_id) is not None
+            except TaskConflictError as error:
+                out.write(f"⚠️  {error}\n")
+                ok = False
+                continue
+            if found:
+                out.write(f"✓ #{task_id} {'completed' if args.command == 'done' else 'deleted'}\n")
+            else:
+                out.write(f"❌ No task #{task_id}\n")
+                ok = False
+        return ok
+
+    if args.command == 'priority':
+        if len(args.ids) > 1:
+            return run_bulk_command(manager, args, args.ids, {}, out)
+        task_id = args.ids[0]
+        try:
+            changed = manager.set_task_priority_by_id(task_id, args.priority)
+        except TaskConflictError as error:
+            out.write(f"⚠️  {error}\n")
+            return False
+        if changed:
+            out.write(f"✓ #{task_id} priority set to {args.priority}\n")
+            return True
+        out.write(f"❌ No task #{task_id}\n")
+        return False
+
+    if args.command == 'stats':
+        counts = manager.get_priority_counts()
+        out.write(f"{manager.get_task_count()} task(s): "
+                  f"{manager.get_incomplete_count()} incomplete | {manager.get_completed_count()} completed\n")
+        out.write(f"🔴 high: {counts['high']}  🟡 medium: {counts['medium']}  🟢 low: {counts['low']}\n")
+        out.write(f"📦 archived: {manager.get_archived_count()}\n")
+        return True
+
+    if args.command == 'next':
+        for task in manager.next_tasks(args.limit):
+            out.write(f"#{task.id} {task}\n")
+        return True
+
+    if args.command == 'archive':
+        count = manager.archive_completed(args.older_than)
+        out.write(f"✓ Archived {count} task(s)\n")
+        return True
+
+    if args.command == 'archived':
+        for task in manager.get_archived_tasks(args.query, limit=args.limit):
+            out.write(f"#{task.id} {task}\n")
+        return True
+
+    if args.command == 'restore':
+        ids = [task_id for selection in args.ids for task_id in selection]
+        restored = manager.restore_archived(ids)
+        out.write(f"✓ Restored {len(restored)} task(s)\n")
+        missing = sorted(set(ids) - {task.id for task in restored})
+        if missing:
+            out.write(f"❌ Not in the archive: {', '.join(f'#{task_id}' for task_id in missing)}\n")
+        return not missing
+
+    if args.command == 'search':
+        for task in manager.search(args.query, limit=args.limit):
+            out.write(f"#{task.id} {task}\n")
+        return True
+
+    if args.command in ('import', 'export'):
+        method = getattr(manager, f"{args.command}_{file_format(args.file, args.format)}")
+        try:
+            count = method(args.file)
+        except (OSError, ValueError) as error:
+            out.write(f"❌ {args.command.capitalize()} failed: {error}\n")
+            return False
+        out.write(f"✓ {'Imported' if args.command == 'import' else 'Exported'} {count} task(s)\n")
+        return True
+
+    return False
+
+
+def run_bulk_command(manager, args, ids, filters, out=sys.stdout):
+    """Run done/rm/priority over many ids and/or filters as one statement; return True if it worked"""
+    try:
+        # Check and change in one transaction, so nothing disappears in between
+        with manager.batch():
+            missing = manager.missing_ids(ids) if ids else []
+            if args.command == 'done':
+                count = manager.complete_where(ids=ids or None, **filters)
+                done = 'completed'
+            elif args.command == 'rm':
+                count = manager.delete_where(ids=ids or None, **filters)
+                done = 'deleted'
+            else:
+                count = manager.set_priority_where(args.priority, ids=ids)
+                done = f'set to {args.priority}'
+    except ValueError as error:
+        out.write(f"❌ {error}\n")
+        return False
+    out.write(f"✓ {count} task(s) {done}\n")
+    if missing:
+        out.write(f"❌ No task {', '.join(f'#{task_id}' for task_id in missing)}\n")
+    return not missing
+
+
+def run_batch(manager, parser, lines, out=sys.stdout):
+    """Run newline-separated commands in one transaction; return the number of failed lines"""
+    import shlex
+
+    failures = 0
+    with manager.batch():
+        for line_number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                args = parser.parse_args(shlex.split(line))
+            except (SystemExit, ValueError):
+                # argparse already printed the problem
+                out.write(f"❌ line {line_number}: could not parse: {line}\n")
+                failures += 1
+                continue
+            if args.command is None or args.batch:
+                out.write(f"❌ line {line_number}: expected a command: {line}\n")
+                failures += 1
+            elif not run_command(manager, args, out):
+                failures += 1
+    return failures
+
+
+def run_cli(argv):
+    """Entry point for the non-interactive commands; returns the exit code"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None and args.batch is None:
+        parser.print_help()
+        return 2
+    if args.cprofile:
+        from instrumentation import profiled
+        with profiled(args.cprofile):
+            return _run_parsed(parser, args)
+    return _run_parsed(parser, args)
+
+
+def _run_parsed(parser, args):
+    """Open the database and run the parsed command or batch; returns the exit code"""
+    # Only read the rows a command actually needs
+    manager = TaskManager(args.db, load=False, profile=args.profile, busy_timeout=args.busy_timeout,
+                          instrument=bool(args.stats), auto_archive_days=args.archive_days)
+    with manager:
+        if args.batch is not None:
+            if args.batch == '-':
+                failures = run_batch(manager, parser, sys.stdin)
+            else:
+                with open(args.batch, encoding='utf-8') as batch_file:
+                    failures = run_batch(manager, parser, batch_file)
+            status = 1 if failures else 0
+        else:
+            status = 0 if run_command(manager, args) else 1
+    if args.stats:
+        manager.instrumentation.write(args.stats)
+    return status
 
 
 # Run the program
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    # TASK_MANAGER_CPROFILE=FILE profiles one interactive session
+    if os.environ.get('TASK_MANAGER_CPROFILE'):
+        from instrumentation import profiled
+        with profiled(os.environ['TASK_MANAGER_CPROFILE']):
+            main()
+    else:
+        main()
@@ -0,0 +1,137 @@
+# threadsafe_task_manager.py
+# TaskManager that can be shared between threads
+
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+
+from task_manager import TaskManager
+
+
+def _writer(method):
+    """Run a TaskManager method while holding the single writer lock"""
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self._writing():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+class _Reader:
+    """Holds one thread's read connection; when the thread ends it is collected"""
+
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+def _close_reader(conn, readers, lock):
+    """Close a finished thread's read connection (unless close() already did)"""
+    with lock:
+        if conn not in readers:
+            return
+        readers.discard(conn)
+    conn.close()
+
+
+class ThreadSafeTaskManager(TaskManager):
+    """TaskManager for multi-threaded servers
+
+    - Writes go through one connection and are serialized by a writer lock.
+    - Reads that go to SQL use a separate connection per thread, so they run
+      in parallel with each other and with the writer (WAL journal).
+    - The in-memory identity map and counters have their own lock, held only
+      while they are being changed or copied, never during database I/O.
+    """
+
+    def __init__(self, db_name='tasks.db', load=True, profile='balanced', **options):
+        if options.get('write_behind') or options.get('columnar'):
+            raise ValueError("ThreadSafeTaskManager does not support write_behind or columnar")
+        self._write_lock = threading.RLock()
+        self._map_lock = threading.RLock()
+        self._local = threading.local()
+        self._readers = set()               # open per-thread connections, so close() can close them
+        self._readers_lock = threading.Lock()
+        super().__init__(db_name, load=load, profile=profile, **options)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the writer lock and note that this thread is writing"""
+        with self._write_lock:
+            self._local.write_depth = getattr(self._local, 'write_depth', 0) + 1
+            try:
+                yield
+            finally:
+                self._local.write_depth -= 1
+
+    def _connect(self):
+        # Shared by every thread that writes (one at a time, under _write_lock)
+        return sqlite3.connect(self.db_name, check_same_thread=False)
+
+    def _read_conn(self):
+        """This thread's read connection (or the writer's, while this thread is writing)"""
+        # Inside a write - or a batch() - we must see our own uncommitted changes
+        if getattr(self._local, 'write_depth', 0):
+            return self.conn
+        reader = getattr(self._local, 'reader', None)
+        if reader is None:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False)
+            conn.execute(f"PRAGMA busy_timeout = {self.settings['busy_timeout']}")
+            conn.execute(f"PRAGMA cache_size = {self.settings['cache_size']}")
+            conn.execute(f"PRAGMA mmap_size = {self.settings['mmap_size']}")
+            if self.instrumentation is not None:
+                conn = self.instrumentation.wrap_connection(conn)
+            reader = self._local.reader = _Reader(conn)
+            with self._readers_lock:
+                self._readers.add(conn)
+            # Thread-local data is dropped when the thread ends, which closes the
+            # connection; thread-per-request servers would leak one per request otherwise
+            weakref.finalize(reader, _close_reader, conn, self._readers, self._readers_lock)
+        return reader.conn
+
+    def close(self):
+        """Close the writer and every reader connection"""
+        with self._writing():
+            with self._readers_lock:
+                for conn in self._readers:
+                    conn.close()
+                self._readers.clear()
+            super().close()
+
+    def _seed_counts(self):
+        """Like TaskManager._seed_counts(), but only waits for the writer lock the first time"""
+        # Once seeded, count reads stay off the writer lock like other reads
+        if self._counts is not None:
+            return
+        with self._writing():
+            # The base method checks again now that the lock is held
+            super()._seed_counts()
+
+    @contextmanager
+    def batch(self):
+        """Like TaskManager.batch(); other threads' writes wait until it ends"""
+        with self._writing():
+            with super().batch():
+                yield self
+
+    # Every method that writes to the database or replaces the identity map
+    add_task = _writer(TaskManager.add_task)
+    add_tasks = _writer(TaskManager.add_tasks)
+    delete_task = _writer(TaskManager.delete_task)
+    delete_task_by_id = _writer(TaskManager.delete_task_by_id)
+    mark_task_complete = _writer(TaskManager.mark_task_complete)
+    mark_task_incomplete = _writer(TaskManager.mark_task_incomplete)
+    _set_task_completed = _writer(TaskManager._set_task_completed)
+    set_task_priority = _writer(TaskManager.set_task_priority)
+    set_task_priority_by_id = _writer(TaskManager.set_task_priority_by_id)
+    load_tasks = _writer(TaskManager.load_tasks)
+    check_counts = _writer(TaskManager.check_counts)
+    refresh = _writer(TaskManager.refresh)
+    complete_where = _writer(TaskManager.complete_where)
+    set_priority_where = _writer(TaskManager.set_priority_where)
+    delete_where = _writer(TaskManager.delete_where)
+    archive_completed = _writer(TaskManager.archive_completed)
+    restore_archived = _writer(TaskManager.restore_archived)